@@ -0,0 +1,84 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from utils.compression import precompress
+from utils.db_router import pin_to_primary
+from utils.renderers import ORJSONRenderer
+from utils.single_flight import cached_single_flight
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """Current catalog version; every cached catalog response is keyed on it"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response after a product or category write"""
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def catalog_cache_key(name, *parts):
+    return ':'.join(['catalog', str(get_catalog_version()), name, *map(str, parts)])
+
+
+def catalog_stale_key(name, *parts):
+    """Unversioned key holding the last value built, served while a rebuild runs"""
+    return ':'.join(['catalog', 'stale', name, *map(str, parts)])
+
+
+def cached_catalog_value(name, parts, compute):
+    """
+    Value cached until the catalog changes; one worker rebuilds it after a change.
+
+    The rebuild reads from the primary: it usually follows a write straight
+    away, and a lagging replica would get its stale rows cached under the
+    new version until the next write.
+    """
+    def compute_on_primary():
+        with pin_to_primary():
+            return compute()
+
+    return cached_single_flight(
+        catalog_cache_key(name, *parts),
+        compute_on_primary,
+        settings.CATALOG_CACHE_TIMEOUT,
+        stale_key=catalog_stale_key(name, *parts),
+    )
+
+
+def query_fingerprint(request):
+    """Stable short digest of the query string, for cache keys"""
+    query = '&'.join(sorted(f'{key}={value}' for key, value in request.query_params.items()))
+    return hashlib.md5(query.encode()).hexdigest()
+
+
+def cached_json_response(name, parts, build_data):
+    """
+    JSON response for a public catalog endpoint, cached until the catalog changes.
+
+    The rendered body is stored together with its gzip/brotli encodings, so
+    rendering and compression are paid once per catalog version (by one
+    worker; the rest briefly keep serving the previous version);
+    CompressionMiddleware picks the encoding the client accepts.
+    """
+    def build_entry():
+        body = ORJSONRenderer().render(build_data())
+        return {'body': body, 'encoded': precompress(body)}
+
+    entry = cached_catalog_value(name, parts, build_entry)
+
+    response = HttpResponse(entry['body'], content_type='application/json')
+    response.precompressed = entry['encoded']
+    return response
@@ -0,0 +1,117 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, Count, DecimalField, F, Q, When
+
+from .catalog_cache import cached_catalog_value
+from .models import Category, Product
+
+# Upper bounds (PHP) of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = [1000, 5000, 10000, 50000]
+
+
+class FacetFilterError(ValueError):
+    pass
+
+
+def _parse_bool(value):
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _parse_price(value, name):
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise FacetFilterError(f'{name} must be a number')
+    # Decimal also accepts NaN and Infinity, which the database can't compare
+    if not price.is_finite():
+        raise FacetFilterError(f'{name} must be a number')
+    return price
+
+
+def normalize_filters(params):
+    """Pull the supported facet filters out of the query params, in a stable order"""
+    filters = {}
+    if params.get('category'):
+        filters['category'] = params['category']
+    if params.get('on_sale') is not None:
+        filters['on_sale'] = _parse_bool(params['on_sale'])
+    if params.get('in_stock') is not None:
+        filters['in_stock'] = _parse_bool(params['in_stock'])
+    if params.get('min_price'):
+        filters['min_price'] = _parse_price(params['min_price'], 'min_price')
+    if params.get('max_price'):
+        filters['max_price'] = _parse_price(params['max_price'], 'max_price')
+    return filters
+
+
+def _bucket_label(index):
+    lower = PRICE_BUCKETS[index - 1] if index else 0
+    if index == len(PRICE_BUCKETS):
+        return f'{lower}+'
+    return f'{lower}-{PRICE_BUCKETS[index]}'
+
+
+def compute_facets(filters):
+    """All facet counts for a filter set, from a single GROUP BY category query"""
+    # The price customers pay: the sale price while a product is on sale
+    products = Product.objects.annotate(
+        effective_price=Case(
+            When(onSale=True, salePrice__gt=0, then=F('salePrice')),
+            default=F('price'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+    if 'category' in filters:
+        path = Category.objects.filter(name=filters['category']).values_list('path', flat=True).first()
+        if path is None:
+            products = products.none()
+        else:
+            # Include every descendant category of the selected one
+            products = products.filter(category__path__startswith=path)
+    if 'on_sale' in filters:
+        products = products.filter(onSale=filters['on_sale'])
+    if 'in_stock' in filters:
+        products = products.filter(stock__gt=0) if filters['in_stock'] else products.filter(stock__lte=0)
+    if 'min_price' in filters:
+        products = products.filter(effective_price__gte=filters['min_price'])
+    if 'max_price' in filters:
+        products = products.filter(effective_price__lte=filters['max_price'])
+
+    bucket_counts = {}
+    for index in range(len(PRICE_BUCKETS) + 1):
+        condition = Q()
+        if index:
+            condition &= Q(effective_price__gte=PRICE_BUCKETS[index - 1])
+        if index < len(PRICE_BUCKETS):
+            condition &= Q(effective_price__lt=PRICE_BUCKETS[index])
+        bucket_counts[f'bucket_{index}'] = Count('productID', filter=condition)
+
+    rows = products.values('category__name').annotate(
+        total=Count('productID'),
+        on_sale=Count('productID', filter=Q(onSale=True)),
+        in_stock=Count('productID', filter=Q(stock__gt=0)),
+        **bucket_counts,
+    ).order_by('category__name')
+
+    facets = {
+        'total': 0,
+        'categories': [],
+        'on_sale': 0,
+        'in_stock': 0,
+        'price': [{'range': _bucket_label(index), 'count': 0} for index in range(len(PRICE_BUCKETS) + 1)],
+    }
+    for row in rows:
+        facets['total'] += row['total']
+        facets['on_sale'] += row['on_sale']
+        facets['in_stock'] += row['in_stock']
+        facets['categories'].append({'name': row['category__name'], 'count': row['total']})
+        for index, bucket in enumerate(facets['price']):
+            bucket['count'] += row[f'bucket_{index}']
+    return facets
+
+
+def get_facets(filters):
+    """Facet counts, served from the cache until the catalog changes"""
+    parts = [f'{name}={value}' for name, value in sorted(filters.items())]
+    return cached_catalog_value('facets', parts, lambda: compute_facets(filters))
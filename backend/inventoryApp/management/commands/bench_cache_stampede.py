@@ -0,0 +1,68 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from inventoryApp.catalog_cache import bump_catalog_version
+from inventoryApp.models import Product
+from utils.single_flight import cached_single_flight
+
+PRODUCT_TABLE = Product._meta.db_table
+
+
+def unprotected(key, compute, timeout, **kwargs):
+    """The plain get / compute / set the catalog cache used before single-flight"""
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+class Command(BaseCommand):
+    help = 'Invalidate the catalog and hit /api/inventory/ from many threads at once; count product queries per invalidation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--query-delay', type=float, default=0.2,
+                            help='Seconds added to every product query, standing in for a large catalog')
+
+    def handle(self, *args, **options):
+        for label, cached in (('unprotected', unprotected), ('single-flight', cached_single_flight)):
+            with mock.patch('inventoryApp.catalog_cache.cached_single_flight', cached):
+                counts = [self.round(options['threads'], options['query_delay']) for _ in range(options['rounds'])]
+            self.stdout.write(f'{label:>14}: product queries per invalidation {counts}')
+
+    def round(self, threads, delay):
+        bump_catalog_version()
+        queries = []
+        statuses = []
+        barrier = threading.Barrier(threads)
+
+        def slow_product_queries(execute, sql, params, many, context):
+            if PRODUCT_TABLE in sql:
+                queries.append(sql)
+                time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def hit():
+            try:
+                with connection.execute_wrapper(slow_product_queries):
+                    barrier.wait()
+                    statuses.append(Client(HTTP_HOST='localhost').get('/api/inventory/').status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=hit) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if set(statuses) != {200}:
+            self.stdout.write(f'Unexpected responses: {sorted(set(statuses))}')
+        return len(queries)
@@ -0,0 +1,68 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+SCHEMAS = {
+    'name': {
+        'category': 'CREATE TABLE category (categoryID INTEGER PRIMARY KEY, name VARCHAR(255) UNIQUE NOT NULL)',
+        'product': 'CREATE TABLE product (productID INTEGER PRIMARY KEY, name VARCHAR(255), price DECIMAL, '
+                   'category_id VARCHAR(255) NOT NULL REFERENCES category (name))',
+        'join': 'SELECT c.name, COUNT(*), SUM(p.price) FROM product p JOIN category c ON c.name = p.category_id GROUP BY c.name',
+    },
+    'id': {
+        'category': 'CREATE TABLE category (categoryID INTEGER PRIMARY KEY, name VARCHAR(255) UNIQUE NOT NULL)',
+        'product': 'CREATE TABLE product (productID INTEGER PRIMARY KEY, name VARCHAR(255), price DECIMAL, '
+                   'category_id INTEGER NOT NULL REFERENCES category (categoryID))',
+        'join': 'SELECT c.name, COUNT(*), SUM(p.price) FROM product p JOIN category c ON c.categoryID = p.category_id GROUP BY c.name',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare join time and index size of a name-keyed vs integer Product.category foreign key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        categories = [(i, f'Offroad Category Number {i:04d}') for i in range(1, options['categories'] + 1)]
+        products = []
+        for product_id in range(1, options['products'] + 1):
+            category_id, category_name = rng.choice(categories)
+            products.append((product_id, f'Product {product_id}', rng.randint(100, 50000) / 100, category_id, category_name))
+
+        for key, schema in SCHEMAS.items():
+            with tempfile.TemporaryDirectory() as tmp:
+                conn = sqlite3.connect(os.path.join(tmp, 'bench.sqlite3'))
+                conn.execute(schema['category'])
+                conn.execute(schema['product'])
+                conn.executemany('INSERT INTO category VALUES (?, ?)', categories)
+                column = 4 if key == 'name' else 3
+                conn.executemany(
+                    'INSERT INTO product VALUES (?, ?, ?, ?)',
+                    ((p[0], p[1], p[2], p[column]) for p in products),
+                )
+                pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+                conn.execute('CREATE INDEX product_category ON product (category_id)')
+                conn.commit()
+                page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+                index_bytes = (conn.execute('PRAGMA page_count').fetchone()[0] - pages_before) * page_size
+
+                conn.execute(schema['join']).fetchall()  # warm the page cache
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    conn.execute(schema['join']).fetchall()
+                join_ms = (time.perf_counter() - start) * 1000 / options['repeat']
+                conn.close()
+
+            self.stdout.write(
+                f"category key={key:<4}  products={options['products']}  "
+                f"index={index_bytes / 1024:,.0f} KiB  join+group={join_ms:.2f} ms"
+            )
@@ -0,0 +1,75 @@
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.renderers import JSONRenderer
+
+from inventoryApp.models import Category, Product
+from inventoryApp.serializers import InventoryReadSerializer, InventorySerializer
+from ordersApp.models import Order
+from ordersApp.serializers import OrderReadSerializer, OrderSerializer
+from utils.renderers import ORJSONRenderer
+
+
+def measure(func):
+    """(milliseconds, peak KiB allocated) for one call; timed without tracing overhead"""
+    start = time.perf_counter()
+    func()
+    elapsed = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+class Command(BaseCommand):
+    help = 'Compare ModelSerializer + JSONRenderer against the values() fast path + orjson for list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Comma-separated row counts')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        # Benchmark rows go into a throwaway test database (test_<NAME>), never
+        # the configured one
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self.run(sizes)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def run(self, sizes):
+        category = Category.objects.create(name='Benchmark category', description='')
+        customer = get_user_model().objects.create_user('benchmark', 'benchmark@example.com', None)
+
+        for size in sizes:
+            Product.objects.all().delete()
+            Product.objects.bulk_create(
+                Product(name=f'Product {i}', description='Heavy duty offroad part. ' * 10, price=1000 + i,
+                        stock=i % 20, category=category, onSale=i % 3 == 0, salePrice=900 + i)
+                for i in range(size)
+            )
+            Order.objects.all().delete()
+            Order.objects.bulk_create(
+                Order(customer=customer, total_price=1500 + i, status='Pending', payment_method='GCASH',
+                      order_delivery_address='Somewhere', tracking_number=f'TRK{i}')
+                for i in range(size)
+            )
+            cases = [
+                ('inventory', lambda: JSONRenderer().render(InventorySerializer(Product.objects.select_related('category'), many=True).data),
+                              lambda: ORJSONRenderer().render(InventoryReadSerializer(Product.objects.all()).data)),
+                ('orders', lambda: JSONRenderer().render(OrderSerializer(Order.objects.all(), many=True).data),
+                           lambda: ORJSONRenderer().render(OrderReadSerializer(Order.objects.all()).data)),
+            ]
+
+            for label, current, fast in cases:
+                current_ms, current_kib = measure(current)
+                fast_ms, fast_kib = measure(fast)
+                self.stdout.write(
+                    f'{label:<10} rows={size:<6} current={current_ms:8.1f} ms {current_kib:9.0f} KiB   '
+                    f'fast={fast_ms:8.1f} ms {fast_kib:9.0f} KiB   speedup={current_ms / fast_ms:4.1f}x'
+                )
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventoryApp.stock import low_stock_products, units_sold_since
+from utils.email_utils import send_html_email
+
+
+class Command(BaseCommand):
+    help = 'Email admins one digest of every product at or below the low-stock threshold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=int, default=None)
+        parser.add_argument('--days', type=int, default=7, help='Window for the units-sold column')
+
+    def handle(self, *args, **options):
+        try:
+            products = list(low_stock_products(options['threshold']))
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not products:
+            self.stdout.write('No low-stock products, nothing sent.')
+            return
+
+        sold = units_sold_since([p['productID'] for p in products], days=options['days'])
+        for product in products:
+            product['units_sold'] = sold.get(product['productID'], 0)
+
+        admins = get_user_model().objects.filter(role='admin').exclude(email='').values_list('email', flat=True)
+        sent = 0
+        for email in admins:
+            if send_html_email(
+                f'Low stock: {len(products)} product(s) need replenishing',
+                'emails/low_stock_digest.html',
+                email,
+                {'products': products, 'days': options['days']},
+            ):
+                sent += 1
+        self.stdout.write(f'Sent low-stock digest for {len(products)} product(s) to {sent} admin(s).')
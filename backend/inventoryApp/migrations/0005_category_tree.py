@@ -0,0 +1,67 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_tree(apps, schema_editor):
+    # Every existing category is top level; give it a path and its counts
+    Category = apps.get_model('inventoryApp', 'Category')
+    Product = apps.get_model('inventoryApp', 'Product')
+    db = schema_editor.connection.alias
+
+    direct = {
+        row['category']: row
+        for row in Product.objects.using(db).values('category').annotate(
+            total=models.Count('productID'),
+            in_stock=models.Count('productID', filter=models.Q(stock__gt=0)),
+        )
+    }
+    categories = list(Category.objects.using(db).all())
+    for category in categories:
+        row = direct.get(category.name, {'total': 0, 'in_stock': 0})
+        category.path = f'{category.categoryID:06d}/'
+        category.depth = 0
+        category.product_count = row['total']
+        category.in_stock_count = row['in_stock']
+    Category.objects.using(db).bulk_update(
+        categories, ['path', 'depth', 'product_count', 'in_stock_count'], batch_size=500
+    )
+
+
+# The new columns get database defaults, so INSERTs from the previous release
+# (which don't know about them) keep working while this one rolls out
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0004_alter_category_name_alter_product_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='inventoryApp.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_default='', db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_tree, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Step 1 of moving Product.category from the category name to categoryID.
+#
+# 0006 and 0007 are additive: they can run while the previous release is still
+# serving traffic. 0008 contracts the schema and should run with the release
+# that ships the new Product.category field
+# (`manage.py migrate inventoryApp 0007`, deploy, then `manage.py migrate`).
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0005_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='category_fk',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventoryApp.category'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Step 2: copy the category name key into the integer column in small batches
+# so no single UPDATE holds locks on a large product table.
+
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_category_fk(apps, schema_editor):
+    Category = apps.get_model('inventoryApp', 'Category')
+    Product = apps.get_model('inventoryApp', 'Product')
+    db = schema_editor.connection.alias
+
+    for category_id, name in Category.objects.using(db).values_list('categoryID', 'name'):
+        pending = Product.objects.using(db).filter(category_id=name, category_fk__isnull=True)
+        while True:
+            batch = list(pending.values_list('productID', flat=True)[:BATCH_SIZE])
+            if not batch:
+                break
+            Product.objects.using(db).filter(productID__in=batch).update(category_fk_id=category_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventoryApp', '0006_product_category_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category_fk, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Step 3: catch rows written by the previous release since 0007, drop the
+# name-keyed column and take over its name.
+
+from importlib import import_module
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+backfill_category_fk = import_module(
+    'inventoryApp.migrations.0007_backfill_product_category_fk'
+).backfill_category_fk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0007_backfill_product_category_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category_fk, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='product',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='product',
+            old_name='category_fk',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventoryApp.category'),
+        ),
+    ]
@@ -1,4 +1,12 @@
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
+from .catalog_cache import bump_catalog_version
+
+# Low-stock lookups (stock <= LOW_STOCK_THRESHOLD) only read a small partial
+# index over products at or below this level; keep the threshold under it.
+LOW_STOCK_INDEX_CEILING = 20
+
 
 # Create your models here.
 class Product(models.Model):
@@ -10,13 +18,62 @@ class Product(models.Model):
     image = models.ImageField(upload_to='product_images/', null=True, blank=True)  # Image of the product
     date_added = models.DateTimeField(auto_now_add=True)  # Date and time the product was added
     date_updated = models.DateTimeField(auto_now=True)  # Date and time the product was last updated
-    category = models.ForeignKey('Category', on_delete=models.CASCADE,to_field='name')  # Category of the product
+    category = models.ForeignKey('Category', on_delete=models.CASCADE)  # Category of the product
     onSale = models.BooleanField(default=False)  # If the product is on sale
     salePrice = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, default=0.00)  # Sale price of the product
     subCategory = models.CharField(max_length=255, null=True, blank=True)  # Subcategory of the product
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock'], name='product_low_stock_idx', condition=Q(stock__lte=LOW_STOCK_INDEX_CEILING)),
+        ]
+
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counted_state()
+        return instance
+
+    def _remember_counted_state(self):
+        # Snapshot what the category counters know about this product, so
+        # save() only touches them when category or in-stock state changes.
+        # None means the row was loaded without those fields (e.g. .only()).
+        if 'category_id' in self.__dict__ and 'stock' in self.__dict__:
+            self._counted = (self.category_id, self.stock > 0)
+        else:
+            self._counted = None
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        counted = getattr(self, '_counted', None)
+        super().save(*args, **kwargs)
+
+        in_stock = self.stock > 0
+        using = self._state.db
+        if adding:
+            adjust_category_counts(self.category_id, 1, int(in_stock), using=using)
+        elif counted is not None:
+            old_category, old_in_stock = counted
+            if old_category != self.category_id:
+                adjust_category_counts(old_category, -1, -int(old_in_stock), using=using)
+                adjust_category_counts(self.category_id, 1, int(in_stock), using=using)
+            elif old_in_stock != in_stock:
+                adjust_category_counts(self.category_id, 0, 1 if in_stock else -1, using=using)
+        self._remember_counted_state()
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        counted = getattr(self, '_counted', None)
+        using = self._state.db
+        result = super().delete(*args, **kwargs)
+        if counted is not None:
+            category, in_stock = counted
+            adjust_category_counts(category, -1, -int(in_stock), using=using)
+        bump_catalog_version()
+        return result
     
 
 class Category(models.Model):
@@ -25,6 +82,136 @@ class Category(models.Model):
     description = models.TextField()  # Description of the category
     date_added = models.DateTimeField(auto_now_add=True)  # Date and time the category was added
     date_updated = models.DateTimeField(auto_now=True)  # Date and time the category was last updated
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')  # Parent category, null for top level
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='', db_default='')  # Materialized path of categoryIDs, e.g. "000001/000004/"
+    depth = models.PositiveSmallIntegerField(default=0, db_default=0, editable=False)  # 0 for top level categories
+    product_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)  # Products in this category and its descendants
+    in_stock_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)  # In-stock products in this category and its descendants
 
     def __str__(self):
         return self.name
+
+    def ancestor_ids(self):
+        """IDs of this category and all of its ancestors, root first"""
+        return path_to_ids(self.path)
+
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+        new_path = (self.parent.path if self.parent_id else '') + f'{self.categoryID:06d}/'
+        if new_path == old_path:
+            return
+
+        manager = Category.objects.using(self._state.db)
+        if old_path:
+            # Re-parented: rewrite the subtree paths and move its counts
+            old_depth = self.depth
+            manager.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_path.count('/') - 1 - old_depth),
+            )
+            self._shift_counts(path_to_ids(old_path)[:-1], -1)
+            self._shift_counts(path_to_ids(new_path)[:-1], 1)
+        else:
+            manager.filter(pk=self.pk).update(path=new_path, depth=new_path.count('/') - 1)
+        self.path = new_path
+        self.depth = new_path.count('/') - 1
+
+    def delete(self, *args, **kwargs):
+        # Products and child categories go with it; take their counts off the ancestors
+        self._shift_counts(self.ancestor_ids()[:-1], -1)
+        result = super().delete(*args, **kwargs)
+        bump_catalog_version()
+        return result
+
+    def _shift_counts(self, ids, sign):
+        if ids and (self.product_count or self.in_stock_count):
+            Category.objects.using(self._state.db).filter(categoryID__in=ids).update(
+                product_count=F('product_count') + sign * self.product_count,
+                in_stock_count=F('in_stock_count') + sign * self.in_stock_count,
+            )
+
+
+def path_to_ids(path):
+    return [int(part) for part in path.split('/') if part]
+
+
+def adjust_category_counts(category_id, product_delta, in_stock_delta, using='default'):
+    """Apply count deltas to a category and all of its ancestors in one UPDATE"""
+    if not product_delta and not in_stock_delta:
+        return
+    path = Category.objects.using(using).filter(categoryID=category_id).values_list('path', flat=True).first()
+    if not path:
+        return
+    Category.objects.using(using).filter(categoryID__in=path_to_ids(path)).update(
+        product_count=F('product_count') + product_delta,
+        in_stock_count=F('in_stock_count') + in_stock_delta,
+    )
+
+
+def rebuild_category_counts(using='default'):
+    """Recompute every category's subtree counts from Product (after bulk stock updates)"""
+    categories = list(Category.objects.using(using).only('categoryID', 'path'))
+    direct = {
+        row['category']: row
+        for row in Product.objects.using(using).values('category').annotate(
+            total=models.Count('productID'),
+            in_stock=models.Count('productID', filter=models.Q(stock__gt=0)),
+        )
+    }
+    totals = {category.categoryID: [0, 0] for category in categories}
+    for category in categories:
+        row = direct.get(category.categoryID)
+        if not row:
+            continue
+        for ancestor_id in path_to_ids(category.path):
+            if ancestor_id in totals:
+                totals[ancestor_id][0] += row['total']
+                totals[ancestor_id][1] += row['in_stock']
+    for category in categories:
+        category.product_count, category.in_stock_count = totals[category.categoryID]
+    Category.objects.using(using).bulk_update(categories, ['product_count', 'in_stock_count'], batch_size=500)
+
+
+class StockMovement(models.Model):
+    """Append-only ledger of every stock change"""
+    REASON_CHOICES = [
+        ('order', 'Order placed'),
+        ('order_cancelled', 'Order cancelled'),
+        ('adjustment', 'Manual adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')  # Product whose stock changed
+    change = models.IntegerField()  # Signed quantity, negative when stock goes out
+    stock_after = models.IntegerField()  # Stock level right after the change
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)  # Why the stock changed
+    order_id = models.IntegerField(null=True, blank=True)  # Related order, if any
+    created_at = models.DateTimeField(auto_now_add=True)  # When the change happened
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} {self.change:+d} ({self.reason})'
+
+
+def record_stock_movements(products, reason, order_id=None):
+    """
+    Write one ledger row per (product, change) pair with a single bulk INSERT.
+    Call after the products' stock has been saved, so stock_after is current.
+    """
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            product=product,
+            change=change,
+            stock_after=product.stock,
+            reason=reason,
+            order_id=order_id,
+        )
+        for product, change in products
+        if change
+    ])
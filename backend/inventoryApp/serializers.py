@@ -3,14 +3,24 @@ from .models import Product, Category
 from django.conf import settings
 import boto3
 from botocore.exceptions import ClientError
+from utils.fast_serializers import FastReadSerializer
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
+    def validate_parent(self, parent):
+        # A category cannot be moved under itself or one of its descendants
+        if parent and self.instance and self.instance.categoryID in parent.ancestor_ids():
+            raise serializers.ValidationError("A category cannot be its own ancestor.")
+        return parent
+
 
 class InventorySerializer(serializers.ModelSerializer):
+    # Products reference categories by ID, but clients still read and write names
+    category = serializers.SlugRelatedField(slug_field='name', queryset=Category.objects.all())
+
     class Meta:
         model = Product
         fields = '__all__'
@@ -42,4 +52,13 @@ class InventorySerializer(serializers.ModelSerializer):
             
 
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class InventoryReadSerializer(FastReadSerializer):
+    """Fast path for the product list; same output as InventorySerializer"""
+    class Meta:
+        model = Product
+        fields = ['productID', 'category', 'name', 'description', 'price', 'stock', 'image',
+                  'date_added', 'date_updated', 'onSale', 'salePrice', 'subCategory']
+        sources = {'category': 'category__name'}
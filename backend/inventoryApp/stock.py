@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import LOW_STOCK_INDEX_CEILING, Product, StockMovement
+
+
+def low_stock_products(threshold=None):
+    """
+    Products at or below the threshold, lowest stock first (served by the
+    partial index). Raises ValueError for a threshold above
+    LOW_STOCK_INDEX_CEILING rather than answering for a lower one.
+    """
+    if threshold is None:
+        threshold = settings.LOW_STOCK_THRESHOLD
+    if threshold > LOW_STOCK_INDEX_CEILING:
+        raise ValueError(f'threshold must be at most {LOW_STOCK_INDEX_CEILING}')
+    return Product.objects.filter(stock__lte=threshold).order_by('stock', 'productID').values(
+        'productID', 'name', 'stock', 'category__name'
+    )
+
+
+def units_sold_since(product_ids, days=7):
+    """Units ordered per product over the last `days` days, from the stock ledger"""
+    since = timezone.now() - timedelta(days=days)
+    rows = StockMovement.objects.filter(
+        product_id__in=product_ids, reason='order', created_at__gte=since
+    ).values('product_id').annotate(units=Sum('change'))
+    return {row['product_id']: -row['units'] for row in rows}
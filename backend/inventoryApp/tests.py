@@ -1,3 +1,442 @@
-from django.test import TestCase
+import gzip
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from userApp.models import User
+from utils.db_router import PrimaryReplicaRouter, ReplicaStickinessMiddleware, read_from_replica
+from utils.log import AsyncJSONHandler
+from utils.query_log import full_scans, log_slow_queries
+from utils.renderers import ORJSONRenderer
+from utils.single_flight import cached_single_flight
+from utils.testing import api_client
+from utils.tracing import BatchSpanProcessor, Span
+
+from . import catalog_cache
+from .catalog_cache import bump_catalog_version
+from .models import Category, Product, rebuild_category_counts
+from .serializers import InventoryReadSerializer, InventorySerializer
+
+
+@contextmanager
+def lagging_replica(test, alias):
+    """A replica alias with the catalog schema but none of the primary's rows: one that has not caught up"""
+    connections.settings[alias] = {**connections.settings['default'], 'NAME': ':memory:'}
+    try:
+        # Django refuses queries to aliases the test case doesn't list
+        with mock.patch.object(type(test), 'databases', {*test.databases, alias}):
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Category)
+                editor.create_model(Product)
+            yield
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+# TransactionTestCase: a TestCase's own transaction would pin every read to the primary
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTests(TransactionTestCase):
+    def route_in_request(self, method='get', cookies=None, read=None):
+        """Alias a catalog read is routed to while the middleware handles a request"""
+        read = read or (lambda: PrimaryReplicaRouter().db_for_read(Product))
+        seen = []
+
+        def view(request):
+            seen.append(read())
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/inventory/')
+        request.COOKIES.update(cookies or {})
+        ReplicaStickinessMiddleware(view)(request)
+        return seen[0]
+
+    def test_catalog_reads_in_web_requests_use_the_replica(self):
+        self.assertEqual(self.route_in_request(), 'replica_0')
+
+    def test_reads_outside_web_requests_use_the_primary(self):
+        # Management commands and background tasks
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Product), 'default')
+        with read_from_replica():
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Product), 'default')
+
+    def test_mutating_and_sticky_requests_read_from_the_primary(self):
+        self.assertEqual(self.route_in_request(method='post'), 'default')
+        self.assertEqual(self.route_in_request(cookies={'db_pin_primary': '1'}), 'default')
+
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        def read_in_transaction():
+            with transaction.atomic():
+                return PrimaryReplicaRouter().db_for_read(Product)
+
+        self.assertEqual(self.route_in_request(read=read_in_transaction), 'default')
+
+
+    def test_catalog_rebuilds_read_from_the_primary(self):
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.create(name='Winch', description='', price=100, stock=3, category=category)
+        bump_catalog_version()
+
+        with lagging_replica(self, 'replica_0'):
+            response = Client().get('/api/inventory/')
+        self.assertEqual([product['name'] for product in response.json()], ['Winch'])
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = Category.objects.create(name='Recovery', description='')
+        self.winches = Category.objects.create(name='Winches', description='', parent=self.root)
+        self.ropes = Category.objects.create(name='Ropes', description='', parent=self.root)
+
+    def counts(self):
+        return {
+            category.name: (category.product_count, category.in_stock_count)
+            for category in Category.objects.all()
+        }
+
+    def test_product_changes_roll_up_to_every_ancestor(self):
+        winch = Product.objects.create(name='Winch', description='', price=100, stock=1, category=self.winches)
+        Product.objects.create(name='Rope', description='', price=10, stock=0, category=self.ropes)
+        self.assertEqual(self.counts(), {'Recovery': (2, 1), 'Winches': (1, 1), 'Ropes': (1, 0)})
+
+        winch = Product.objects.get(pk=winch.pk)
+        winch.stock = 0
+        winch.save()
+        self.assertEqual(self.counts(), {'Recovery': (2, 0), 'Winches': (1, 0), 'Ropes': (1, 0)})
+
+        winch.category = self.ropes
+        winch.save()
+        self.assertEqual(self.counts(), {'Recovery': (2, 0), 'Winches': (0, 0), 'Ropes': (2, 0)})
+
+        winch.delete()
+        self.assertEqual(self.counts(), {'Recovery': (1, 0), 'Winches': (0, 0), 'Ropes': (1, 0)})
+
+    def test_moving_a_category_moves_its_subtree_and_counts(self):
+        Product.objects.create(name='Winch', description='', price=100, stock=1, category=self.winches)
+        lighting = Category.objects.create(name='Lighting', description='')
+        winches = Category.objects.get(pk=self.winches.pk)
+        winches.parent = lighting
+        winches.save()
+
+        self.assertEqual(self.counts(), {'Recovery': (0, 0), 'Winches': (1, 1), 'Ropes': (0, 0), 'Lighting': (1, 1)})
+        self.assertEqual(Category.objects.get(pk=winches.pk).ancestor_ids(), [lighting.pk, winches.pk])
+        before = self.counts()
+        rebuild_category_counts()
+        self.assertEqual(self.counts(), before)
+
+    def test_tree_endpoint_nests_children_under_their_parents(self):
+        Product.objects.create(name='Winch', description='', price=100, stock=1, category=self.winches)
+        tree = APIClient().get('/api/category/tree/').json()
+
+        self.assertEqual([node['name'] for node in tree], ['Recovery'])
+        self.assertEqual(tree[0]['product_count'], 1)
+        self.assertEqual([child['name'] for child in tree[0]['children']], ['Winches', 'Ropes'])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        recovery = Category.objects.create(name='Recovery', description='')
+        winches = Category.objects.create(name='Winches', description='', parent=recovery)
+        lighting = Category.objects.create(name='Lighting', description='')
+        Product.objects.create(name='Winch', description='', price=20000, stock=2, category=winches,
+                               onSale=True, salePrice=9000)
+        Product.objects.create(name='Shackle', description='', price=800, stock=0, category=recovery)
+        Product.objects.create(name='Light bar', description='', price=6000, stock=5, category=lighting)
+
+    def facets(self, **params):
+        response = APIClient().get('/api/inventory/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_every_facet_with_sale_prices_in_the_price_buckets(self):
+        facets = self.facets()
+        self.assertEqual((facets['total'], facets['on_sale'], facets['in_stock']), (3, 1, 2))
+        self.assertEqual(facets['categories'], [
+            {'name': 'Lighting', 'count': 1}, {'name': 'Recovery', 'count': 1}, {'name': 'Winches', 'count': 1},
+        ])
+        self.assertEqual([bucket['count'] for bucket in facets['price']], [1, 0, 2, 0, 0])
+
+    def test_a_category_filter_includes_its_subcategories(self):
+        facets = self.facets(category='Recovery', in_stock='true')
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['categories'], [{'name': 'Winches', 'count': 1}])
+
+    def test_invalid_prices_are_rejected(self):
+        for price in ('cheap', 'nan', 'Infinity', '-inf', 'sNaN'):
+            with self.subTest(price=price):
+                self.assertEqual(APIClient().get('/api/inventory/facets/', {'min_price': price}).status_code, 400)
+
+
+class CategoryForeignKeyTests(TestCase):
+    def test_renaming_a_category_keeps_its_products(self):
+        category = Category.objects.create(name='Winches', description='')
+        product = Product.objects.create(name='Winch', description='', price=100, stock=1, category=category)
+        category.name = 'Electric Winches'
+        category.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).category.name, 'Electric Winches')
+
+    def test_previous_release_can_insert_categories_without_the_tree_columns(self):
+        # What the release before the category tree sends
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{Category._meta.db_table}" (name, description, date_added, date_updated) '
+                "VALUES ('Lighting', '', %s, %s)", [timezone.now(), timezone.now()],
+            )
+        category = Category.objects.get(name='Lighting')
+        self.assertEqual((category.path, category.depth, category.product_count, category.in_stock_count), ('', 0, 0, 0))
+
+
+class LowStockTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.create(name='Low', description='', price=100, stock=2, category=category)
+        Product.objects.create(name='Plenty', description='', price=100, stock=50, category=category)
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+
+    def test_admins_see_products_at_or_below_the_threshold(self):
+        response = api_client(self.admin).get('/api/inventory/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.json()], ['Low'])
+
+    def test_customers_are_refused(self):
+        self.assertEqual(api_client(self.customer).get('/api/inventory/low-stock/').status_code, 403)
+
+    def test_thresholds_above_the_index_ceiling_are_refused(self):
+        response = api_client(self.admin).get('/api/inventory/low-stock/', {'threshold': 50})
+        self.assertEqual(response.status_code, 400)
+        response = api_client(self.admin).get('/api/inventory/low-stock/', {'threshold': 20})
+        self.assertEqual([row['name'] for row in response.json()], ['Low'])
+
+
+class ReadSerializerTests(TestCase):
+    def test_fast_read_serializer_renders_like_the_model_serializer(self):
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.create(name='Winch', description='12k lb', price='1234.50', stock=3, category=category,
+                               onSale=True, salePrice='999.99', subCategory='Electric Winches')
+
+        current = JSONRenderer().render(InventorySerializer(Product.objects.all(), many=True).data)
+        fast = ORJSONRenderer().render(InventoryReadSerializer(Product.objects.all()).data)
+        self.assertEqual(json.loads(fast), json.loads(current))
+
+
+class CatalogStampedeTests(TransactionTestCase):
+    def test_concurrent_misses_after_an_invalidation_run_one_catalog_query(self):
+        cache.clear()
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.create(name='Winch', description='', price=100, stock=3, category=category)
+        threads = 8
+        barrier = threading.Barrier(threads)
+        statuses, product_queries = [], []
+        precompress = catalog_cache.precompress
+
+        def slow_precompress(body):
+            # Keep the first request rebuilding while the others miss
+            time.sleep(0.2)
+            return precompress(body)
+
+        def hit():
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    barrier.wait()
+                    statuses.append(Client().get('/api/inventory/').status_code)
+                product_queries.extend(
+                    query['sql'] for query in captured.captured_queries if Product._meta.db_table in query['sql']
+                )
+            finally:
+                connection.close()
+
+        bump_catalog_version()
+        with mock.patch('inventoryApp.catalog_cache.precompress', side_effect=slow_precompress):
+            workers = [threading.Thread(target=hit) for _ in range(threads)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(statuses, [200] * threads)
+        self.assertEqual(len(product_queries), 1)
+
+
+@override_settings(SINGLE_FLIGHT_LOCK_SECONDS=1, SINGLE_FLIGHT_WAIT_SECONDS=0.1)
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Another process is recomputing 'report'
+        cache.add('report:lock', 1)
+
+    def test_waiters_serve_the_stale_value_while_another_process_recomputes(self):
+        cache.set('report:stale', 'old')
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(cached_single_flight('report', compute, 60, stale_key='report:stale'), 'old')
+        compute.assert_not_called()
+
+    def test_waiters_take_the_lock_over_once_it_is_released(self):
+        threading.Timer(0.2, cache.delete, ['report:lock']).start()
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(cached_single_flight('report', compute, 60), 'new')
+        compute.assert_called_once()
+        self.assertEqual(cache.get('report'), 'new')
+
+    def test_waiters_never_compute_without_the_lock(self):
+        compute = mock.Mock(return_value='new')
+        with self.assertRaises(TimeoutError):
+            cached_single_flight('report', compute, 60)
+        compute.assert_not_called()
+
+
+class AsyncJSONHandlerTests(TestCase):
+    def record(self, message):
+        return logging.makeLogRecord({'name': 'ordersApp', 'levelno': logging.INFO, 'levelname': 'INFO', 'msg': message})
+
+    def test_the_listener_thread_starts_with_the_first_record(self):
+        handler = AsyncJSONHandler()
+        self.assertIsNone(handler.listener)
+        with mock.patch.object(handler.stream, 'emit') as write:
+            handler.handle(self.record('hello'))
+            handler.close()
+        self.assertEqual(write.call_args.args[0].msg, 'hello')
+
+    def test_dropped_records_are_reported_once_the_queue_has_room(self):
+        handler = AsyncJSONHandler(queue_size=2, drop_report_seconds=0)
+        with mock.patch.object(AsyncJSONHandler, '_start_listener'):
+            for number in range(4):
+                handler.handle(self.record(f'record {number}'))
+            self.assertEqual(handler.dropped, 2)
+            while not handler.queue.empty():
+                handler.queue.get_nowait()
+            handler.handle(self.record('record 4'))
+
+        queued = [handler.queue.get_nowait(), handler.queue.get_nowait()]
+        self.assertEqual([record.msg for record in queued], ['record 4', 'Dropped 2 log records: the log queue was full'])
+        self.assertEqual((queued[1].levelno, queued[1].dropped_records, handler.dropped), (logging.WARNING, 2, 0))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.create(name='Winch', description='12k lb', price=100, stock=3, category=category)
+
+    def test_fields_narrow_the_response_and_the_select(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/inventory/', {'fields': 'productID,name,category'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(row) for row in response.json()], [{'productID', 'name', 'category'}])
+        self.assertEqual(response.json()[0]['category'], 'Winches')
+        product_query = next(query['sql'] for query in queries.captured_queries if Product._meta.db_table in query['sql'])
+        self.assertNotIn('"description"', product_query)
+
+    def test_exclude_drops_fields(self):
+        row = APIClient().get('/api/inventory/', {'exclude': 'description,image'}).json()[0]
+        self.assertNotIn('description', row)
+        self.assertNotIn('image', row)
+        self.assertEqual(row['name'], 'Winch')
+
+    def test_unknown_fields_are_rejected(self):
+        self.assertEqual(APIClient().get('/api/inventory/', {'fields': 'name,password'}).status_code, 400)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Winches', description='')
+        Product.objects.bulk_create([
+            Product(name=f'Winch {number}', description='Synthetic rope winch ' * 5, price=100, stock=3, category=category)
+            for number in range(20)
+        ])
+
+    def test_catalog_responses_are_sent_precompressed(self):
+        plain = Client().get('/api/inventory/')
+        self.assertNotIn('Content-Encoding', plain)
+
+        with mock.patch('utils.compression.compress') as compress:
+            response = Client().get('/api/inventory/', HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()  # stored with the cache entry
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_responses_are_left_alone(self):
+        response = Client().get('/api/category/tree/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+
+class TracingTests(TestCase):
+    TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+
+    def get_traced(self, flags):
+        cache.clear()
+        Category.objects.create(name='Winches', description='')
+        with mock.patch('utils.tracing.get_processor') as get_processor:
+            response = Client().get('/api/category/tree/', HTTP_TRACEPARENT=f'00-{self.TRACE_ID}-00f067aa0ba902b7-{flags}')
+        self.assertEqual(response.status_code, 200)
+        return [call.args[0] for call in get_processor.return_value.submit.call_args_list]
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_sampled_requests_continue_the_callers_trace_with_query_spans(self):
+        spans = self.get_traced('00')
+        root = spans[-1]  # ends last
+        self.assertEqual((root.name, root.parent_id, root.attributes['http.status_code']),
+                         ('GET /api/category/tree/', '00f067aa0ba902b7', 200))
+        queries = [span for span in spans if span.name == 'db.query']
+        self.assertTrue(queries)
+        self.assertTrue(all(span.trace_id == self.TRACE_ID and span.parent_id == root.span_id for span in queries))
+        self.assertTrue(any(Category._meta.db_table in span.attributes['db.statement'] for span in queries))
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_clients_cannot_force_sampling(self):
+        self.assertEqual(self.get_traced('01'), [])
+
+    @override_settings(TRACING_SAMPLE_RATE=1, TRACING_TRUST_TRACEPARENT=True)
+    def test_a_trusted_proxys_sampling_decision_is_followed(self):
+        self.assertEqual(self.get_traced('00'), [])
+
+    def test_dropped_spans_are_reported(self):
+        exporter = mock.Mock()
+        exporter.export.side_effect = OSError('collector down')
+        with mock.patch('utils.tracing.threading.Thread'):  # exported by flush() below instead
+            processor = BatchSpanProcessor(exporter, queue_size=1, drop_report_seconds=60)
+        processor.submit(Span('GET /', self.TRACE_ID))
+        processor.submit(Span('GET /', self.TRACE_ID))  # queue full
+
+        with self.assertLogs('utils.tracing', 'WARNING') as logs:
+            processor.flush()
+        self.assertEqual(logs.records[0].getMessage(), 'Dropped 2 spans: export failed (OSError: collector down)')
+        self.assertEqual(logs.records[0].dropped_spans, 2)
+
+
+class SlowQueryLogTests(TestCase):
+    def test_full_scans_are_read_from_either_databases_plan(self):
+        self.assertEqual(full_scans('sqlite', ['SCAN inventoryApp_product', 'SEARCH c USING INTEGER PRIMARY KEY (rowid=?)',
+                                               'SCAN o USING INDEX order_customer_idx']), ['inventoryApp_product'])
+        self.assertEqual(full_scans('postgresql', ['Seq Scan on "ordersApp_order"  (cost=0.00..1.01 rows=1)',
+                                                   'Index Scan using pk on "inventoryApp_product"']), ['"ordersApp_order"'])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_their_plan_and_call_site(self):
+        with self.assertLogs('utils.query_log', 'WARNING') as logs, connection.execute_wrapper(log_slow_queries):
+            list(Product.objects.filter(description='12k lb'))
+            Product.objects.filter(description='12k lb').update(stock=1)
+
+        select, update = logs.records
+        self.assertIn('inventoryApp/tests.py', select.getMessage())
+        self.assertEqual(select.full_scans, [Product._meta.db_table])
+        self.assertTrue(select.plan)
+        self.assertIsNone(update.plan)  # writes are never EXPLAINed
@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import InventoryCrud, CategoryCrud, GeneratePresignedUrl
+from .views import InventoryCrud, CategoryCrud, CategoryTreeView, InventoryFacetsView, LowStockView, GeneratePresignedUrl
 urlpatterns = [
     path('inventory/', InventoryCrud.as_view()),
+    path('inventory/facets/', InventoryFacetsView.as_view()),
+    path('inventory/low-stock/', LowStockView.as_view()),
     path('category/', CategoryCrud.as_view()),
+    path('category/tree/', CategoryTreeView.as_view()),
     #s3 save images for qr code
     path('generate-presigned-url/', GeneratePresignedUrl.as_view(), name='generate_presigned_url'),
 ]
@@ -5,29 +5,38 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import Http404
-from .models import Product, Category
-from .serializers import InventorySerializer, CategorySerializer
+from .models import Product, Category, record_stock_movements
+from .serializers import InventorySerializer, InventoryReadSerializer, CategorySerializer
+from .facets import FacetFilterError, get_facets, normalize_filters
+from .stock import low_stock_products
+from .catalog_cache import cached_json_response, query_fingerprint
+from ordersApp.idempotency import idempotent
+from utils.fast_serializers import InvalidFieldsError, sparse_fieldset
+from utils.tracing import span
 from django.conf import settings
 import jwt
+import logging
 import boto3
 from botocore.exceptions import ClientError
 
 
 # Create your views here.
+logger = logging.getLogger(__name__)
 
 def create_presigned_post(bucket_name, object_name, fields=None, conditions=None, expiration=3600):
     """Generate a presigned URL S3 POST request to upload a file"""
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
-    try:
-        response = s3_client.generate_presigned_post(bucket_name, object_name, Fields=fields, Conditions=conditions, ExpiresIn=expiration)
-    except ClientError as e:
-        print(e)
-        return None
+    with span('s3.presign_post', **{'s3.bucket': bucket_name, 's3.key': object_name}):
+        s3_client = boto3.client(
+            's3',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME
+        )
+        try:
+            response = s3_client.generate_presigned_post(bucket_name, object_name, Fields=fields, Conditions=conditions, ExpiresIn=expiration)
+        except ClientError:
+            logger.exception('Could not create presigned POST for %s', object_name)
+            return None
     return response
 
 
@@ -56,10 +65,15 @@ class InventoryCrud(APIView):
     # permission_classes = [IsAuthenticated]
     def get(self, request, format=None):
             inventory = Product.objects.all()
-            serializer = InventorySerializer(inventory, many=True)
-            return Response(serializer.data)
+            try:
+                serializer = InventoryReadSerializer(inventory, **sparse_fieldset(request))
+            except InvalidFieldsError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            # Served from the catalog cache (with precompressed bodies) until a product changes
+            return cached_json_response('inventory', [query_fingerprint(request)], lambda: serializer.data)
         
 
+    @idempotent
     def post(self, request, format=None):
         # Handle image separately
         image_url = request.data.pop('image', None)
@@ -92,9 +106,11 @@ class InventoryCrud(APIView):
         
 
         # Update other fields using the serializer
+        old_stock = inventory.stock
         serializer = InventorySerializer(inventory, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            inventory = serializer.save()
+            record_stock_movements([(inventory, inventory.stock - old_stock)], 'adjustment')
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -156,4 +172,54 @@ class CategoryCrud(APIView):
         except Category.DoesNotExist:
             return Response({'error': 'Category not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CategoryTreeView(APIView):
+    """Whole category navigation tree with product counts, for the storefront"""
+    def get(self, request, format=None):
+        return cached_json_response('category_tree', [], self.build_tree)
+
+    @staticmethod
+    def build_tree():
+        # Ordering by the materialized path yields parents before children
+        nodes = Category.objects.order_by('path').values(
+            'categoryID', 'name', 'parent', 'depth', 'product_count', 'in_stock_count'
+        )
+
+        tree = []
+        by_id = {}
+        for node in nodes:
+            node['children'] = []
+            by_id[node['categoryID']] = node
+            parent = by_id.get(node.pop('parent'))
+            (parent['children'] if parent else tree).append(node)
+        return tree
+
+
+class InventoryFacetsView(APIView):
+    """Facet counts (category, on sale, in stock, price range) for a filter set"""
+    def get(self, request, format=None):
+        try:
+            filters = normalize_filters(request.query_params)
+        except FacetFilterError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(get_facets(filters))
+
+
+class LowStockView(APIView):
+    """Products that need replenishing, for the admin inventory screen"""
+    permission_classes = [IsAuthenticated]
+    def get(self, request, format=None):
+        if request.user.role != 'admin':
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        threshold = request.query_params.get('threshold')
+        try:
+            threshold = int(threshold) if threshold is not None else None
+        except ValueError:
+            return Response({'error': 'threshold must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            products = low_stock_products(threshold)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(list(products))
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Orders in these statuses can no longer change status. A cancelled order
+# still waiting for its refund is updated once more (PUT /orders/, which only
+# looks up live orders), so it stays live until the refund is recorded.
+ARCHIVABLE_STATUSES = ('Completed', 'Cancelled')
+PENDING_REFUND = 'To Be Refunded'
+
+# Live and archived (order, item) models; readers that must see every order
+# (history, reports, the recommendations rebuild) go through both.
+ORDER_STORES = [(Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)]
+
+PARTITIONED_TABLES = {
+    ArchivedOrder._meta.db_table: 'created_at',
+    ArchivedOrderItem._meta.db_table: 'order_created_at',
+}
+
+
+def month_start(year, month):
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+
+def archive_cutoff(months, now=None):
+    """Start of the month `months` months before `now`; older orders get archived"""
+    now = now or timezone.now()
+    return month_start(now.year, now.month - months)
+
+
+def ensure_month_partitions(start, end):
+    """Create the monthly archive partitions covering [start, end) (PostgreSQL only)"""
+    if connection.vendor != 'postgresql':
+        return
+    month = month_start(start.year, start.month)
+    with connection.cursor() as cursor:
+        while month < end:
+            following = month_start(month.year, month.month + 1)
+            for table in PARTITIONED_TABLES:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{table}_{month:%Y_%m}" PARTITION OF "{table}" '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [month, following],
+                )
+            month = following
+
+
+def archivable_orders(cutoff):
+    return Order.objects.filter(created_at__lt=cutoff, status__in=ARCHIVABLE_STATUSES).exclude(refund_status=PENDING_REFUND)
+
+
+def archive_batch(candidates, order_ids):
+    """
+    Copy a batch of orders and their items into the archive and delete them
+    from the live tables, atomically. Returns (orders moved, items moved).
+    Orders are locked through `candidates`, so one that stopped being
+    archivable after its id was read (a refund marked pending) stays live.
+    """
+    order_fields = [field.attname for field in Order._meta.concrete_fields]
+    item_fields = [field.attname for field in OrderItem._meta.concrete_fields]
+    archived_at = timezone.now()
+
+    with transaction.atomic():
+        orders = list(candidates.select_for_update().filter(pk__in=order_ids).values(*order_fields))
+        if not orders:
+            return 0, 0
+        created = {order['id']: order['created_at'] for order in orders}
+        items = list(OrderItem.objects.filter(order_id__in=created).values(*item_fields))
+
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**order, archived_at=archived_at) for order in orders])
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(**item, order_created_at=created[item['order_id']]) for item in items
+        ])
+        OrderItem.objects.filter(order_id__in=created).delete()
+        Order.objects.filter(pk__in=created).delete()
+    return len(orders), len(items)
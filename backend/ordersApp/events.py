@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+import orjson
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+ADMIN_CHANNEL = 'orders:admin'
+# Events a slow subscriber may fall behind by before new ones are dropped
+SUBSCRIBER_BACKLOG = 100
+
+
+def customer_channel(customer_id):
+    return f'orders:customer:{customer_id}'
+
+
+def _replayable(history, since, now):
+    """
+    Buffered events a client resuming after event `since` missed, oldest
+    first. A client ahead of the channel saw ids from before a restart of
+    the broker, so everything buffered since is new to it.
+    """
+    fresh = [event for stamp, event in history if stamp > now - settings.ORDER_EVENTS_REPLAY_SECONDS]
+    if history and since > history[-1][1]['id']:
+        return fresh
+    return [event for event in fresh if event['id'] > since]
+
+
+class InProcessBroker:
+    """Pub/sub between threads of one process (runserver, a single gunicorn worker)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._last_ids = defaultdict(int)
+        self._history = defaultdict(lambda: deque(maxlen=settings.ORDER_EVENTS_REPLAY_SIZE))
+
+    def publish(self, channel, event):
+        with self._lock:
+            self._last_ids[channel] += 1
+            event = {**event, 'id': self._last_ids[channel]}
+            self._history[channel].append((time.time(), event))
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def subscribe(self, channel, since=None):
+        """Events published on `channel` from now on, after those buffered since event id `since`"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._lock:
+            if since is not None:
+                for event in _replayable(self._history.get(channel, ()), since, time.time())[-SUBSCRIBER_BACKLOG:]:
+                    subscriber.put_nowait(event)
+            self._subscribers[channel].add(subscriber)
+        return InProcessSubscription(self, channel, subscriber)
+
+    def _unsubscribe(self, channel, subscriber):
+        with self._lock:
+            self._subscribers[channel].discard(subscriber)
+            if not self._subscribers[channel]:
+                del self._subscribers[channel]
+
+
+class InProcessSubscription:
+    def __init__(self, broker, channel, subscriber):
+        self.broker = broker
+        self.channel = channel
+        self.subscriber = subscriber
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return self.subscriber.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker._unsubscribe(self.channel, self.subscriber)
+
+
+class RedisBroker:
+    """Pub/sub across processes and hosts through Redis (ORDER_EVENTS_REDIS_URL)"""
+
+    def __init__(self):
+        import redis
+        self.client = redis.Redis.from_url(settings.ORDER_EVENTS_REDIS_URL)
+
+    def publish(self, channel, event):
+        event = {**event, 'id': self.client.incr(f'{channel}:last_id')}
+        history = f'{channel}:history'
+        with self.client.pipeline() as pipe:
+            pipe.rpush(history, orjson.dumps([time.time(), event]))
+            pipe.ltrim(history, -settings.ORDER_EVENTS_REPLAY_SIZE, -1)
+            pipe.expire(history, settings.ORDER_EVENTS_REPLAY_SECONDS)
+            pipe.publish(channel, orjson.dumps(event))
+            pipe.execute()
+
+    def subscribe(self, channel, since=None):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        backlog = []
+        if since is not None:
+            # Read after subscribing so nothing falls in between; events
+            # that arrive both ways are skipped by id
+            history = sorted((orjson.loads(entry) for entry in self.client.lrange(f'{channel}:history', 0, -1)),
+                             key=lambda entry: entry[1]['id'])
+            backlog = _replayable(history, since, time.time())
+        return RedisSubscription(pubsub, backlog)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub, backlog):
+        self.pubsub = pubsub
+        self.backlog = deque(backlog)
+        self.last_id = backlog[-1]['id'] if backlog else 0
+
+    def get(self, timeout):
+        if self.backlog:
+            return self.backlog.popleft()
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self.pubsub.get_message(timeout=max(deadline - time.monotonic(), 0))
+            if message is None:
+                return None
+            event = orjson.loads(message['data'])
+            if event['id'] > self.last_id:
+                return event
+
+    def close(self):
+        self.pubsub.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.ORDER_EVENTS_BROKER)()
+    return _broker
+
+
+def publish_order_event(order, event_type):
+    """Tell the order's customer and all admins about a change, once it is committed"""
+    event = {
+        'type': event_type,
+        'order_id': order.id,
+        'status': order.status,
+        'tracking_number': order.tracking_number,
+        'refund_status': order.refund_status,
+        'refund_date': order.refund_date.isoformat() if hasattr(order.refund_date, 'isoformat') else order.refund_date,
+    }
+
+    def publish():
+        broker = get_broker()
+        broker.publish(customer_channel(order.customer_id), event)
+        broker.publish(ADMIN_CHANNEL, event)
+
+    transaction.on_commit(publish)
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+from functools import wraps
+
+import orjson
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+KEY_RE = re.compile(r'^[\w.:-]{1,255}$')
+
+# Answers the client should be able to retry with the same key and get a
+# different result (login again, wait); these release the key instead of
+# being stored. 5xx responses are never stored either.
+RETRYABLE_STATUSES = {401, 403, 408, 409, 429}
+
+StoredResponse = namedtuple('StoredResponse', 'fingerprint status_code body expires')
+
+
+class ExpiringLRU:
+    """Thread-safe LRU map of at most maxsize entries, each dropped at its own expiry (epoch seconds)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+# Completed keys never change, so each process can answer repeats from
+# memory; the table is what makes keys hold across processes and restarts
+front_cache = ExpiringLRU(settings.IDEMPOTENCY_FRONT_CACHE_SIZE)
+
+
+def request_owner(request):
+    """Username the key is scoped to, or None for an anonymous request (those are not deduplicated)"""
+    user = request.user
+    return user.get_username() if user.is_authenticated else None
+
+
+def _plain(value):
+    if isinstance(value, UploadedFile):
+        return f'file:{value.name}:{value.size}'
+    return value
+
+
+def request_fingerprint(request):
+    """Hash of what the key promises: the same method, path and body"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: [_plain(value) for value in values] for key, values in data.lists()}
+    body = orjson.dumps([request.method, request.path, data], default=str, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(body).hexdigest()
+
+
+def _stored(row):
+    return StoredResponse(row.fingerprint, row.status_code, row.response_body, row.expires_at.timestamp())
+
+
+def claim_key(owner, key, fingerprint):
+    """
+    Take the key for this request, inside the caller's transaction. Returns
+    (row, None) when the caller holds it and must run the view, or
+    (None, StoredResponse) for a key someone already used. A concurrent
+    request with the same key waits on the unique constraint until this
+    transaction ends, then replays its response (or takes the key if it
+    rolled back). A key past its expiry is taken over.
+    """
+    while True:
+        now = timezone.now()
+        expires_at = now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+        try:
+            with transaction.atomic():
+                row = IdempotencyKey.objects.create(
+                    owner=owner, key=key, fingerprint=fingerprint, started_at=now, expires_at=expires_at,
+                )
+            return row, None
+        except IntegrityError:
+            pass
+
+        row = IdempotencyKey.objects.select_for_update().filter(owner=owner, key=key).first()
+        if row is None:
+            continue  # rolled back or swept meanwhile; try to insert again
+        if row.expires_at > now:
+            return None, _stored(row)
+
+        row.fingerprint, row.status_code, row.response_body = fingerprint, None, ''
+        row.started_at, row.expires_at = now, expires_at
+        row.save()
+        return row, None
+
+
+def store_response(row, response):
+    row.status_code = response.status_code
+    row.response_body = orjson.dumps(response.data, default=str).decode() if response.data is not None else ''
+    row.save(update_fields=['status_code', 'response_body'])
+
+
+def replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        return Response(
+            {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(orjson.loads(stored.body) if stored.body else None, status=stored.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(method):
+    """
+    Make a mutating APIView method safe to retry. A request carrying an
+    Idempotency-Key header runs once per (user, key); repeats within
+    IDEMPOTENCY_KEY_TTL_HOURS get the stored response back (marked with
+    Idempotent-Replayed) without running the view again. Requests without
+    the header, or without a logged-in user, run as before.
+
+    Claiming the key, the view's writes and the stored response commit in
+    one transaction, so there is never a key without its response or a
+    response whose writes were lost.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not KEY_RE.match(key):
+            return Response({'error': f'Invalid {IDEMPOTENCY_HEADER}'}, status=status.HTTP_400_BAD_REQUEST)
+        owner = request_owner(request)
+        if owner is None:
+            return method(view, request, *args, **kwargs)
+
+        fingerprint = request_fingerprint(request)
+        stored = front_cache.get((owner, key))
+        if stored is None:
+            with transaction.atomic():
+                row, stored = claim_key(owner, key, fingerprint)
+                if row is not None:
+                    response = method(view, request, *args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code >= 500 or response.status_code in RETRYABLE_STATUSES:
+                        row.delete()
+                        return response
+                    store_response(row, response)
+            if row is not None:
+                front_cache.set((owner, key), _stored(row))
+                return response
+
+        front_cache.set((owner, key), stored)
+        logger.info('Replaying idempotent request', extra={'owner': owner, 'idempotency_key': key, 'status_code': stored.status_code})
+        return replay(stored, fingerprint)
+
+    return wrapper
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from ordersApp.archive import archivable_orders, archive_batch, archive_cutoff, ensure_month_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Move completed and cancelled orders older than --months into the archive '
+        'tables in batches; they stay visible through the order history API (schedule monthly)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=None, help='Defaults to ORDER_ARCHIVE_MONTHS')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        months = options['months'] if options['months'] is not None else settings.ORDER_ARCHIVE_MONTHS
+        cutoff = archive_cutoff(months)
+        candidates = archivable_orders(cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'Would archive {candidates.count()} order(s) created before {cutoff:%Y-%m-%d}.')
+            return
+
+        oldest = candidates.aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None:
+            self.stdout.write(f'No orders created before {cutoff:%Y-%m-%d} to archive.')
+            return
+        ensure_month_partitions(oldest, cutoff)
+
+        started = time.perf_counter()
+        orders = items = batches = 0
+        while True:
+            ids = list(candidates.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            moved_orders, moved_items = archive_batch(candidates, ids)
+            orders += moved_orders
+            items += moved_items
+            batches += 1
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(
+            f'Archived {orders} order(s) and {items} item(s) created before {cutoff:%Y-%m-%d} '
+            f'in {batches} batch(es), {time.perf_counter() - started:.2f}s.'
+        )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from utils.email_utils import build_html_email
+
+
+def order_context(order_id):
+    return {
+        'order_id': order_id,
+        'customer_name': 'Juan Dela Cruz',
+        'orders': [{
+            'order_id': order_id,
+            'status': 'Completed',
+            'status_message': 'Your order is on its way.',
+            'tracking_number': f'WP{order_id:08d}',
+            'items': [
+                {'name': f'Winch cable {n}', 'quantity': n + 1, 'price': f'{1250 + n * 100}.00'}
+                for n in range(3)
+            ],
+        }],
+        'site_url': 'http://localhost:3000',
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time rendering order update emails, the template alone and the full MIME message. '
+        "Templates come from Django's cached loader (the default, DEBUG included), so this is render cost only"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+        parser.add_argument('--template', default='emails/order_updates.html')
+
+    def handle(self, *args, **options):
+        count, template = options['count'], options['template']
+        contexts = [order_context(order_id) for order_id in range(count)]
+
+        cases = [
+            ('template             ', lambda context: render_to_string(template, context)),
+            ('full message (MIME)  ', lambda context: build_html_email('Order update', template, 'customer@example.com', context).message().as_bytes()),
+        ]
+        for label, render in cases:
+            started = time.perf_counter()
+            for context in contexts:
+                render(dict(context))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{label} {count} emails: {elapsed:.2f}s ({elapsed / count * 1e6:.0f}us each, {count / elapsed:.0f}/s)')
@@ -0,0 +1,129 @@
+import re
+from collections import defaultdict
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from inventoryApp.models import Category, Product
+from userApp.tokens import RoleRefreshToken
+from utils.query_log import call_site, explain, full_scans
+
+User = get_user_model()
+
+# Literal values vary between runs of the same query; fold them for grouping
+LITERAL_RE = re.compile(r"'[^']*'|\b\d+\b")
+
+
+class Rollback(Exception):
+    pass
+
+
+def workload(product_id, category_name, year):
+    """(label, role, path) for the read endpoints the storefront and admin pages hit most"""
+    return [
+        ('catalog', None, '/api/inventory/'),
+        ('facets', None, f'/api/inventory/facets/?category={category_name}'),
+        ('category tree', None, '/api/category/tree/'),
+        ('related products', None, f'/api/products/related/?product={product_id}'),
+        ('customer orders', 'customer', '/api/orders/'),
+        ('customer cart', 'customer', '/api/cart/'),
+        ('admin orders', 'admin', '/api/orders/'),
+        ('low stock', 'admin', '/api/inventory/low-stock/'),
+        ('user directory', 'admin', '/api/users/directory/?search=a'),
+        ('revenue report', 'admin', f'/api/reports/revenue/?type=pdf&year={year}'),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Replay the main read endpoints, EXPLAIN every query and report the ones that scan a table without an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='List every query plan, not just full scans')
+
+    def handle(self, *args, **options):
+        self.queries = {}  # normalized sql -> {sql, params, alias, endpoints, call site}
+        # Caches would hide the queries; everything the workload writes
+        # (e.g. a customer's empty cart) is rolled back
+        try:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                with transaction.atomic():
+                    self.replay()
+                    raise Rollback()
+        except Rollback:
+            pass
+        self.report(options['all'])
+
+    def record(self, execute, sql, params, many, context):
+        key = LITERAL_RE.sub('?', sql)
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = {
+                'sql': sql, 'params': params, 'alias': context['connection'].alias,
+                'endpoints': set(), 'call_site': call_site(skip=[__file__]), 'count': 0,
+            }
+        entry['endpoints'].add(self.current)
+        entry['count'] += 1
+        return execute(sql, params, many, context)
+
+    def client_for(self, role):
+        client = Client(HTTP_HOST='localhost')
+        if role is None:
+            return client
+        user = User.objects.filter(role=role).order_by('pk').first()
+        if user is None:
+            return None
+        token = str(RoleRefreshToken.for_user(user).access_token_for(user))
+        client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        client.cookies['jwt_access_token'] = token
+        return client
+
+    def replay(self):
+        product = Product.objects.order_by('pk').first()
+        category = Category.objects.order_by('pk').first()
+        clients = {role: self.client_for(role) for role in (None, 'customer', 'admin')}
+        steps = workload(product.pk if product else 1, category.name if category else '', datetime.now().year)
+
+        for label, role, path in steps:
+            client = clients[role]
+            if client is None:
+                self.stdout.write(f'Skipping {label}: no {role} user')
+                continue
+            self.current = label
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(self.record))
+                status = client.get(path).status_code
+            if status >= 400:
+                self.stdout.write(f'{label}: {path} returned {status}')
+
+    def report(self, show_all):
+        by_table = defaultdict(list)
+        scanned = 0
+        for entry in self.queries.values():
+            connection = connections[entry['alias']]
+            try:
+                plan = explain(connection, entry['sql'], entry['params'])
+            except Exception as e:
+                plan = [f'EXPLAIN failed: {e}']
+            if plan is None:
+                continue
+            tables = full_scans(connection.vendor, plan)
+            if not tables and not show_all:
+                continue
+            scanned += bool(tables)
+            for table in tables or ['(indexed)']:
+                by_table[table].append((entry, plan))
+
+        self.stdout.write(f'{len(self.queries)} distinct queries, {scanned} with a full table scan\n')
+        for table, entries in sorted(by_table.items()):
+            self.stdout.write(self.style.WARNING(table) if table != '(indexed)' else table)
+            for entry, plan in entries:
+                self.stdout.write(f"  {', '.join(sorted(entry['endpoints']))} (x{entry['count']}) at {entry['call_site']}")
+                self.stdout.write(f"    {entry['sql'][:300]}")
+                for line in plan:
+                    self.stdout.write(f'      {line}')
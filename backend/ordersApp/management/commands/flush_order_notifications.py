@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ordersApp.notifications import flush_order_notifications
+
+
+class Command(BaseCommand):
+    help = 'Send the combined order update emails whose window has passed (schedule every minute, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Send everything pending, ignoring the window')
+
+    def handle(self, *args, **options):
+        customers, sent = flush_order_notifications(window=0 if options['all'] else None)
+        self.stdout.write(f'Sent {sent} combined email(s) to {customers} customer(s).')
@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ordersApp.models import Cart, CartItem, IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete old cart items, stale empty carts and expired idempotency keys, and clear '
+        'expired password reset codes, in small batches (schedule daily)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be reclaimed')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+        now = timezone.now()
+
+        # Items first, so carts they leave empty are swept in the same run
+        sweeps = [
+            ('cart items', CartItem.objects.filter(date_updated__lt=now - timedelta(days=settings.CART_ITEM_MAX_AGE_DAYS)), self.delete_batch),
+            ('empty carts', Cart.objects.filter(items__isnull=True, date_added__lt=now - timedelta(days=settings.STALE_CART_DAYS)), self.delete_batch),
+            ('reset codes', get_user_model().objects.filter(reset_code__isnull=False).filter(
+                Q(reset_code_sent_at__isnull=True)
+                | Q(reset_code_sent_at__lt=now - timedelta(minutes=settings.RESET_CODE_TTL_MINUTES))
+            ), self.clear_reset_codes),
+            ('idempotency keys', IdempotencyKey.objects.filter(expires_at__lt=now), self.delete_batch),
+        ]
+
+        total = 0
+        for label, queryset, apply_batch in sweeps:
+            started = time.perf_counter()
+            rows, batches = self.sweep(queryset, apply_batch)
+            total += rows
+            verb = 'would reclaim' if self.dry_run else 'reclaimed'
+            self.stdout.write(f'{label}: {verb} {rows} row(s) in {batches} batch(es), {time.perf_counter() - started:.2f}s')
+        self.stdout.write(f'Total: {total} row(s){" (dry run)" if self.dry_run else ""}.')
+
+    def sweep(self, queryset, apply_batch):
+        if self.dry_run:
+            # Counted against the current rows, so carts that the item sweep
+            # would empty are not included yet
+            return queryset.count(), 0
+
+        rows = batches = 0
+        while True:
+            # Short transactions over a bounded set of primary keys, so no
+            # statement holds locks on more than batch_size rows
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return rows, batches
+            with transaction.atomic():
+                rows += apply_batch(queryset, ids)
+            batches += 1
+            if self.pause:
+                time.sleep(self.pause)
+
+    # Batches are applied through the sweep's own queryset, so a row that
+    # stopped matching after its id was read (a cart that just got an item,
+    # a reset code sent again) is left alone
+
+    @staticmethod
+    def delete_batch(queryset, ids):
+        _, deleted = queryset.filter(pk__in=ids).delete()
+        return deleted.get(queryset.model._meta.label, 0)
+
+    @staticmethod
+    def clear_reset_codes(queryset, ids):
+        return queryset.filter(pk__in=ids).update(reset_code=None, reset_code_sent_at=None)
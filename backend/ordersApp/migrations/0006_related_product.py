@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0009_stock_movement_low_stock_index'),
+        ('ordersApp', '0005_order_refund_date_order_refund_proof_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventoryApp.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventoryApp.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-count'], name='related_product_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='related_product_pair_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Cold storage for old orders (filled by the archive_orders command).
+#
+# Django only tracks the models; the tables are created below. On PostgreSQL
+# both are range-partitioned by month, with monthly partitions added by the
+# archive command and a DEFAULT partition for anything else. A partitioned
+# table's primary key has to include the partition key, hence (id, created_at).
+# SQLite (dev) gets plain tables.
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+POSTGRES_TABLES = [
+    """
+    CREATE TABLE "ordersApp_archivedorder" (
+        "id" bigint NOT NULL,
+        "customer_id" bigint NOT NULL,
+        "status" varchar(50) NOT NULL,
+        "created_at" timestamp with time zone NOT NULL,
+        "total_price" numeric(10, 2) NOT NULL,
+        "tracking_number" varchar(50) NULL,
+        "payment_method" varchar(50) NULL,
+        "proof_of_payment" varchar(100) NULL,
+        "order_delivery_address" text NULL,
+        "refund_status" varchar(20) NULL,
+        "refund_proof" varchar(255) NULL,
+        "refund_date" timestamp with time zone NULL,
+        "archived_at" timestamp with time zone NOT NULL,
+        PRIMARY KEY ("id", "created_at")
+    ) PARTITION BY RANGE ("created_at")
+    """,
+    'CREATE TABLE "ordersApp_archivedorder_default" PARTITION OF "ordersApp_archivedorder" DEFAULT',
+    'CREATE INDEX "archived_order_customer_idx" ON "ordersApp_archivedorder" ("customer_id", "created_at")',
+    """
+    CREATE TABLE "ordersApp_archivedorderitem" (
+        "id" bigint NOT NULL,
+        "order_id" bigint NOT NULL,
+        "product_id" integer NOT NULL,
+        "quantity" integer NOT NULL CHECK ("quantity" >= 0),
+        "price" numeric(10, 2) NOT NULL,
+        "order_created_at" timestamp with time zone NOT NULL,
+        PRIMARY KEY ("id", "order_created_at")
+    ) PARTITION BY RANGE ("order_created_at")
+    """,
+    'CREATE TABLE "ordersApp_archivedorderitem_default" PARTITION OF "ordersApp_archivedorderitem" DEFAULT',
+    'CREATE INDEX "ordersApp_archivedorderitem_order_id_idx" ON "ordersApp_archivedorderitem" ("order_id")',
+    'CREATE INDEX "ordersApp_archivedorderitem_product_id_idx" ON "ordersApp_archivedorderitem" ("product_id")',
+]
+
+
+def create_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_TABLES:
+            schema_editor.execute(statement)
+        return
+    schema_editor.create_model(apps.get_model('ordersApp', 'ArchivedOrder'))
+    schema_editor.create_model(apps.get_model('ordersApp', 'ArchivedOrderItem'))
+
+
+def drop_tables(apps, schema_editor):
+    # Partitions are dropped with their parent table
+    schema_editor.execute('DROP TABLE "ordersApp_archivedorderitem"')
+    schema_editor.execute('DROP TABLE "ordersApp_archivedorder"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0009_stock_movement_low_stock_index'),
+        ('ordersApp', '0007_cartitem_date_updated'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.CreateModel(
+                name='ArchivedOrder',
+                fields=[
+                    ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                    ('status', models.CharField(max_length=50)),
+                    ('created_at', models.DateTimeField()),
+                    ('total_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                    ('tracking_number', models.CharField(max_length=50, null=True)),
+                    ('payment_method', models.CharField(max_length=50, null=True)),
+                    ('proof_of_payment', models.ImageField(null=True, upload_to='proof_of_payment/')),
+                    ('order_delivery_address', models.TextField(null=True)),
+                    ('refund_status', models.CharField(blank=True, choices=[('To Be Refunded', 'To Be Refunded'), ('Refunded', 'Refunded')], max_length=20, null=True)),
+                    ('refund_proof', models.CharField(blank=True, max_length=255, null=True)),
+                    ('refund_date', models.DateTimeField(blank=True, null=True)),
+                    ('archived_at', models.DateTimeField()),
+                    ('customer', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ],
+            ),
+            migrations.CreateModel(
+                name='ArchivedOrderItem',
+                fields=[
+                    ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                    ('quantity', models.PositiveIntegerField(default=1)),
+                    ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                    ('order_created_at', models.DateTimeField()),
+                    ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='ordersApp.archivedorder')),
+                    ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventoryApp.product')),
+                ],
+            ),
+            migrations.AddIndex(
+                model_name='archivedorder',
+                index=models.Index(fields=['customer', 'created_at'], name='archived_order_customer_idx'),
+            ),
+        ]),
+        migrations.RunPython(create_tables, drop_tables),
+    ]
@@ -59,6 +59,119 @@ class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')  # Reference to the cart
     product = models.ForeignKey(Product, on_delete=models.CASCADE)  # Reference to the product
     quantity = models.IntegerField()  # Quantity of the product
+    date_updated = models.DateTimeField(auto_now=True)  # Last time the item was added or changed
 
     def __str__(self):
         return f'{self.cart.customer} - {self.product} - {self.quantity}'
+
+
+class RelatedProduct(models.Model):
+    """How many completed orders contained both products; stored once per direction"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')  # Product being viewed / in the cart
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')  # Product bought together with it
+    count = models.PositiveIntegerField(default=0)  # Completed orders containing both
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='related_product_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-count'], name='related_product_top_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} ({self.count})'
+
+
+class ArchivedOrder(models.Model):
+    """
+    Orders moved out of Order by the archive_orders command; same columns plus
+    archived_at. On PostgreSQL the table is range-partitioned by month on
+    created_at (see migration 0008), so the primary key there is (id, created_at).
+    """
+    id = models.BigIntegerField(primary_key=True)  # Same id the order had while live
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_constraint=False, db_index=False, related_name='+')  # Covered by archived_order_customer_idx
+    status = models.CharField(max_length=50)
+    created_at = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    tracking_number = models.CharField(max_length=50, null=True)
+    payment_method = models.CharField(max_length=50, null=True)
+    proof_of_payment = models.ImageField(upload_to='proof_of_payment/', null=True)
+    order_delivery_address = models.TextField(null=True)
+    refund_status = models.CharField(max_length=20, choices=Order.REFUND_STATUS_CHOICES, null=True, blank=True)
+    refund_proof = models.CharField(max_length=255, null=True, blank=True)
+    refund_date = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField()  # When the order left the live table
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='archived_order_customer_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    """OrderItem rows of archived orders, partitioned like ArchivedOrder (on order_created_at)"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE, db_constraint=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    order_created_at = models.DateTimeField()  # Partition key, copied from the order
+
+    def __str__(self):
+        return f"{self.quantity} of {self.product_id} at {self.price}"
+
+
+class OrderNotification(models.Model):
+    """An order change waiting to go out in the customer's next combined email"""
+    KIND_CHOICES = [
+        ('status', 'Status changed'),
+        ('tracking', 'Tracking number set'),
+        ('refund', 'Refund status changed'),
+    ]
+
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')  # Who gets the email
+    order_id = models.BigIntegerField()  # Order that changed
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)  # What changed
+    value = models.CharField(max_length=255)  # New status, tracking number or refund status
+    created_at = models.DateTimeField(auto_now_add=True)  # When the change happened
+    claim = models.CharField(max_length=32, blank=True, default='', db_index=True)  # Flush run sending it, if any
+    claimed_at = models.DateTimeField(null=True, blank=True)  # When that flush claimed it
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.customer_id} order {self.order_id} {self.kind}={self.value}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client's Idempotency-Key and the response it got, so a retried request
+    is answered from here instead of running again (see ordersApp/idempotency.py).
+    A row is committed in the same transaction as the request's writes and
+    its response, so status_code is only null inside that transaction.
+    """
+    owner = models.CharField(max_length=150)  # Username the key belongs to; keys are per user
+    key = models.CharField(max_length=255)  # Client-chosen key, e.g. a UUID per checkout attempt
+    fingerprint = models.CharField(max_length=64)  # Hash of method, path and body the key was first used with
+    status_code = models.PositiveSmallIntegerField(null=True)  # Stored response status, null until the response is stored
+    response_body = models.TextField(default='')  # Stored response data as JSON
+    started_at = models.DateTimeField()  # When the request holding the key started
+    expires_at = models.DateTimeField()  # After this the key may be reused; expired rows are swept
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='idempotency_owner_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.owner}:{self.key} -> {self.status_code}'
@@ -0,0 +1,137 @@
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from utils.email_utils import build_html_email, send_bulk_emails
+
+from .models import OrderItem, OrderNotification
+
+STATUS_MESSAGES = {
+    'Pending': 'Your order is now being processed.',
+    'Completed': 'Your order has been completed and is on its way!',
+    'Cancelled': 'Your order has been cancelled. Any payments will be refunded.',
+}
+
+# Customers claimed and emailed per batch
+FLUSH_BATCH_SIZE = 100
+
+
+def queue_order_notifications(changes):
+    """
+    Hold order changes for ORDER_NOTIFICATION_WINDOW_SECONDS so each customer
+    gets one email covering everything that happened to their orders in that
+    window. `changes` is a list of (order, kind, value). They go out on the
+    next run of the flush_order_notifications command (scheduled every minute).
+    """
+    if not changes:
+        return
+    OrderNotification.objects.bulk_create([
+        OrderNotification(customer_id=order.customer_id, order_id=order.id, kind=kind, value=value)
+        for order, kind, value in changes
+    ])
+
+
+def claim_notifications(customer_ids):
+    """
+    Mark the customers' unclaimed changes as ours, so a concurrent flush
+    leaves them alone; returns them. Claims older than
+    ORDER_NOTIFICATION_CLAIM_SECONDS (a flush that died mid-send) are taken
+    over.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4().hex
+    stale = now - timedelta(seconds=settings.ORDER_NOTIFICATION_CLAIM_SECONDS)
+    # A single UPDATE, committed before any email is sent
+    OrderNotification.objects.filter(customer__in=customer_ids).filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale)
+    ).update(claim=claim, claimed_at=now)
+    return list(OrderNotification.objects.filter(claim=claim).order_by('created_at', 'pk')), claim
+
+
+def flush_order_notifications(window=None):
+    """
+    Send one combined email per customer whose oldest pending change is at
+    least `window` seconds old. Changes are claimed first and deleted per
+    customer once their email is accepted, so a failed send is retried on
+    the next flush without repeating the emails that did go out.
+    Returns (customers, emails sent).
+    """
+    window = settings.ORDER_NOTIFICATION_WINDOW_SECONDS if window is None else window
+    cutoff = timezone.now() - timedelta(seconds=window)
+    customer_ids = list(
+        OrderNotification.objects.values('customer')
+        .annotate(first=Min('created_at'))
+        .filter(first__lte=cutoff)
+        .values_list('customer', flat=True)
+    )
+
+    sent = 0
+    for start in range(0, len(customer_ids), FLUSH_BATCH_SIZE):
+        rows, claim = claim_notifications(customer_ids[start:start + FLUSH_BATCH_SIZE])
+        claimed = OrderNotification.objects.filter(claim=claim)
+        messages = build_digest_messages(rows)
+        # Customers without an email address have nothing to wait for
+        claimed.exclude(customer__in=list(messages)).delete()
+
+        delivered = send_bulk_emails(list(messages.values()))
+        for customer_id, message in messages.items():
+            if message in delivered:
+                claimed.filter(customer=customer_id).delete()
+                sent += 1
+            else:
+                claimed.filter(customer=customer_id).update(claim='', claimed_at=None)
+    return len(customer_ids), sent
+
+
+def build_digest_messages(rows):
+    """{customer_id: message}; for each order only the latest value of each kind counts"""
+    changes = defaultdict(lambda: defaultdict(dict))
+    for row in rows:
+        changes[row.customer_id][row.order_id][row.kind] = row.value
+
+    customers = get_user_model().objects.only('id', 'email', 'first_name', 'last_name').in_bulk(list(changes))
+    cancelled = [
+        order_id
+        for orders in changes.values()
+        for order_id, kinds in orders.items()
+        if kinds.get('status') == 'Cancelled'
+    ]
+    items = defaultdict(list)
+    for item in OrderItem.objects.filter(order_id__in=cancelled).values('order_id', 'quantity', 'price', 'product__name'):
+        items[item['order_id']].append({'name': item['product__name'], 'quantity': item['quantity'], 'price': item['price']})
+
+    messages = {}
+    for customer_id, orders in changes.items():
+        customer = customers.get(customer_id)
+        if customer is None or not customer.email:
+            continue
+        context_orders = [
+            {
+                'order_id': order_id,
+                'status': kinds.get('status'),
+                'status_message': STATUS_MESSAGES.get(kinds.get('status'), 'Your order status has been updated.'),
+                'tracking_number': kinds.get('tracking'),
+                'refund_status': kinds.get('refund'),
+                'items': items.get(order_id, []),
+            }
+            for order_id, kinds in sorted(orders.items())
+        ]
+        if len(context_orders) == 1:
+            subject = f"Order #{context_orders[0]['order_id']} Update"
+        else:
+            subject = f'Updates on {len(context_orders)} of your orders'
+        messages[customer_id] = build_html_email(
+            subject,
+            'emails/order_updates.html',
+            customer.email,
+            {
+                'customer_name': f'{customer.first_name} {customer.last_name}',
+                'orders': context_orders,
+            },
+        )
+    return messages
@@ -0,0 +1,119 @@
+from collections import Counter
+from itertools import permutations
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import ArchivedOrderItem, OrderItem, RelatedProduct
+
+
+def basket_pairs(order_ids, product_ids):
+    """
+    Count how often each ordered pair of products shares an order.
+
+    Takes two parallel arrays of (order, product) rows sorted by order, with
+    no duplicate products inside an order. Returns (product, related, count)
+    arrays, both directions included. Baskets over RELATED_PRODUCTS_MAX_BASKET
+    items (bulk/wholesale orders) are ignored, as they relate everything to everything.
+    """
+    order_ids = np.asarray(order_ids, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    if not len(order_ids):
+        return empty, empty, empty
+
+    starts = np.flatnonzero(np.r_[True, order_ids[1:] != order_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(order_ids)])
+    keep = np.repeat(sizes <= settings.RELATED_PRODUCTS_MAX_BASKET, sizes)
+    product_ids = product_ids[keep]
+    sizes = sizes[sizes <= settings.RELATED_PRODUCTS_MAX_BASKET]
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+
+    # Pair every row with each later row of the same order: row i has
+    # (end of its order - i - 1) partners, laid out one after another.
+    rows = np.arange(len(product_ids))
+    partners = np.repeat(starts + sizes, sizes) - rows - 1
+    left = np.repeat(rows, partners)
+    right = left + 1 + (np.arange(len(left)) - np.repeat(np.cumsum(partners) - partners, partners))
+    a, b = product_ids[left], product_ids[right]
+
+    # Encode each directed pair as one integer so np.unique can count them
+    width = int(product_ids.max()) + 1 if len(product_ids) else 1
+    keys, counts = np.unique(np.concatenate([a * width + b, b * width + a]), return_counts=True)
+    return keys // width, keys % width, counts
+
+
+def rebuild_related_products(batch_size=5000):
+    """Recompute the whole index from completed orders; returns the number of pairs written"""
+    # Archived orders keep their ids, so live and archived rows never share an order
+    rows = np.concatenate([
+        np.array(
+            item_model.objects.filter(order__status='Completed').values_list('order_id', 'product_id').distinct(),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        for item_model in (OrderItem, ArchivedOrderItem)
+    ])
+    rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+    products, related, counts = basket_pairs(rows[:, 0], rows[:, 1])
+
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        for start in range(0, len(counts), batch_size):
+            end = start + batch_size
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=p, related_id=r, count=c)
+                for p, r, c in zip(products[start:end].tolist(), related[start:end].tolist(), counts[start:end].tolist())
+            ])
+    return len(counts)
+
+
+def record_completed_orders(order_ids):
+    """
+    Add newly completed orders to the index (runs in the background).
+    Two concurrent updates of the same new pair can lose an increment; the
+    periodic rebuild_related_products evens that out.
+    """
+    baskets = {}
+    for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id'):
+        baskets.setdefault(order_id, set()).add(product_id)
+
+    increments = Counter()
+    for products in baskets.values():
+        if len(products) <= settings.RELATED_PRODUCTS_MAX_BASKET:
+            increments.update(permutations(products, 2))
+    if not increments:
+        return
+
+    touched = {product for pair in increments for product in pair}
+    with transaction.atomic():
+        existing = {
+            (row.product_id, row.related_id): row.count
+            for row in RelatedProduct.objects.filter(product__in=touched, related__in=touched)
+        }
+        RelatedProduct.objects.bulk_create(
+            [
+                RelatedProduct(product_id=p, related_id=r, count=existing.get((p, r), 0) + n)
+                for (p, r), n in increments.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'related'],
+            update_fields=['count'],
+        )
+
+
+def related_product_scores(product_ids, limit):
+    """
+    Top `limit` products bought together with any of `product_ids` (a product
+    page passes one id, the cart page all of its items), best first.
+    Returns [(product_id, score)].
+    """
+    return list(
+        RelatedProduct.objects.filter(product__in=product_ids, related__stock__gt=0)
+        .exclude(related__in=product_ids)
+        .values('related')
+        .annotate(score=Sum('count'))
+        .order_by('-score', 'related')
+        .values_list('related', 'score')[:limit]
+    )
@@ -0,0 +1,257 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from inventoryApp.catalog_cache import bump_catalog_version
+from inventoryApp.models import Category, Product, rebuild_category_counts
+
+from .models import Cart, CartItem, Order, OrderItem
+
+User = get_user_model()
+
+SEED_USER_PREFIX = 'seed_user_'
+SEED_PASSWORD = 'seedpassword'
+
+# Top level category -> subcategories; products go in the subcategories
+CATEGORY_TREE = {
+    'Winches': ['Electric Winches', 'Hydraulic Winches', 'Winch Mounts', 'Winch Ropes', 'Winch Controllers'],
+    'Recovery Gear': ['Snatch Straps', 'Shackles', 'Recovery Boards', 'Hi-Lift Jacks', 'Tree Trunk Protectors'],
+    'Lighting': ['Light Bars', 'Spot Lights', 'Fog Lights', 'Rock Lights', 'Work Lights'],
+    'Suspension': ['Lift Kits', 'Shock Absorbers', 'Coil Springs', 'Leaf Springs', 'Steering Dampers'],
+    'Bumpers & Armor': ['Front Bumpers', 'Rear Bumpers', 'Skid Plates', 'Rock Sliders', 'Bull Bars'],
+    'Wheels & Tires': ['All-Terrain Tires', 'Mud-Terrain Tires', 'Alloy Wheels', 'Steel Wheels', 'Tire Deflators'],
+    'Roof & Storage': ['Roof Racks', 'Roof Top Tents', 'Cargo Boxes', 'Drawer Systems', 'Jerry Can Holders'],
+    'Electrical': ['Dual Battery Kits', 'Air Compressors', 'Switch Panels', 'Wiring Harnesses', 'Inverters'],
+    'Engine & Intake': ['Snorkels', 'Air Filters', 'Exhaust Systems', 'Intercoolers', 'Diff Breathers'],
+    'Camping': ['Awnings', 'Fridges', 'Camp Kitchens', 'Water Tanks', 'Recovery Kits'],
+}
+BRANDS = ['Warn', 'ARB', 'Smittybilt', 'Rhino-Rack', 'Ironman', 'TJM', 'Lightforce', 'Maxtrax', 'Bushranger', 'Factor 55']
+MODEL_WORDS = ['Trail', 'Summit', 'Ridge', 'Canyon', 'Outback', 'Sierra', 'Terra', 'Atlas', 'Vanguard', 'Ranger']
+
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Miguel', 'Sofia', 'Carlo', 'Bea', 'Paolo', 'Isabel', 'Marco', 'Liza',
+               'Rafael', 'Camille', 'Diego', 'Patricia', 'Andres', 'Nicole', 'Gabriel', 'Trisha']
+LAST_NAMES = ['Santos', 'Reyes', 'Cruz', 'Bautista', 'Garcia', 'Mendoza', 'Torres', 'Flores', 'Ramos', 'Villanueva',
+              'Castillo', 'Aquino', 'Navarro', 'Dela Cruz', 'Gonzales', 'Lopez', 'Fernandez', 'Rivera', 'Domingo', 'Salazar']
+CITIES = ['Quezon City', 'Makati', 'Pasig', 'Cebu City', 'Davao City', 'Baguio', 'Iloilo City', 'Bacolod',
+          'Cagayan de Oro', 'Tagaytay']
+STREETS = ['Rizal St.', 'Mabini St.', 'Bonifacio Ave.', 'Luna St.', 'Aguinaldo Hwy.', 'Quezon Ave.', 'Del Pilar St.']
+PAYMENT_METHODS = ['GCASH', 'GCASH', 'GCASH', 'Maya', 'Bank Transfer']
+
+# Orders younger than this are mostly still Pending; older ones are mostly settled
+RECENT_ORDER_DAYS = 7
+# Chance that each extra item in an order comes from the first item's subcategory
+SAME_CATEGORY_AFFINITY = 0.6
+
+
+def chunk_rng(seed, name, index=0):
+    """Random generator for one chunk of one table; the same (seed, name, index) always yields the same rows"""
+    return random.Random(f'{seed}:{name}:{index}')
+
+
+def delivery_address(rng):
+    return f'{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}'
+
+
+def seed_categories():
+    """Create the category tree (existing categories are reused); returns the subcategories"""
+    leaves = []
+    for name, children in CATEGORY_TREE.items():
+        parent, _ = Category.objects.get_or_create(name=name, defaults={'description': f'{name} for off-road builds'})
+        for child in children:
+            leaf, _ = Category.objects.get_or_create(
+                name=child, defaults={'description': f'{child} ({name})', 'parent': parent},
+            )
+            leaves.append(leaf)
+    return leaves
+
+
+def seed_products(count, leaves, seed, batch_size):
+    """Bulk-create `count` products across the subcategories; counts and the catalog cache are fixed up after"""
+    rng = chunk_rng(seed, 'products')
+    # Some subcategories carry far more products than others
+    weights = list(accumulate(rng.paretovariate(1.5) for _ in leaves))
+    batch = []
+    created = 0
+    for _ in range(count):
+        leaf = rng.choices(leaves, cum_weights=weights)[0]
+        price = Decimal(round(math.exp(rng.uniform(math.log(300), math.log(150000))), -1)).quantize(Decimal('0.01'))
+        on_sale = rng.random() < 0.15
+        stock = 0 if rng.random() < 0.05 else rng.choice([rng.randint(1, 20), rng.randint(20, 400)])
+        brand = rng.choice(BRANDS)
+        name = f'{brand} {rng.choice(MODEL_WORDS)} {leaf.name.rstrip("s")} {rng.randint(100, 9999)}'
+        batch.append(Product(
+            name=name,
+            description=f'{name}: {leaf.name.lower()} built for trail and recovery use.',
+            price=price,
+            stock=stock,
+            category=leaf,
+            subCategory=leaf.name,
+            onSale=on_sale,
+            salePrice=(price * Decimal(rng.choice(['0.95', '0.9', '0.85', '0.8', '0.7']))).quantize(Decimal('0.01')) if on_sale else Decimal('0.00'),
+        ))
+        if len(batch) >= batch_size:
+            created += len(Product.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        created += len(Product.objects.bulk_create(batch))
+    rebuild_category_counts()
+    bump_catalog_version()
+    return created
+
+
+def seed_users(count, seed, batch_size, end, years):
+    """
+    Bulk-create customers named seed_user_NNNNNNN, continuing after any from
+    an earlier run. They all share one hashed SEED_PASSWORD: hashing per user
+    would dominate the run.
+    """
+    rng = chunk_rng(seed, 'users')
+    start = User.objects.filter(username__startswith=SEED_USER_PREFIX).count()
+    password = make_password(SEED_PASSWORD)
+    span = timedelta(days=365 * years).total_seconds()
+    batch = []
+    created = 0
+    for number in range(start, start + count):
+        username = f'{SEED_USER_PREFIX}{number:07d}'
+        batch.append(User(
+            username=username,
+            email=f'{username}@example.com',
+            password=password,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            role='customer',
+            delivery_address=delivery_address(rng),
+            date_joined=end - timedelta(seconds=span * rng.random()),
+        ))
+        if len(batch) >= batch_size:
+            created += len(User.objects.bulk_create(batch))
+            batch = []
+    if batch:
+        created += len(User.objects.bulk_create(batch))
+    return created
+
+
+def seed_carts(users, product_ids, seed, share):
+    """Give a `share` of the users an open cart with a few items"""
+    rng = chunk_rng(seed, 'carts')
+    owners = [username for username in users if rng.random() < share]
+    carts = Cart.objects.bulk_create([Cart(customer_id=username) for username in owners], batch_size=5000)
+    items = []
+    for cart in carts:
+        for product_id in set(rng.choices(product_ids, k=rng.randint(1, 4))):
+            items.append(CartItem(cart=cart, product_id=product_id, quantity=rng.randint(1, 3)))
+    CartItem.objects.bulk_create(items, batch_size=5000)
+    return len(carts), len(items)
+
+
+# Set in the parent before the worker pool forks, so tasks only carry chunk numbers
+_context = None
+
+
+def set_order_context(context):
+    global _context
+    _context = context
+
+
+def order_status(rng, age_days):
+    roll = rng.random()
+    if age_days < RECENT_ORDER_DAYS:
+        return 'Pending' if roll < 0.7 else 'Completed' if roll < 0.95 else 'Cancelled'
+    return 'Completed' if roll < 0.88 else 'Cancelled' if roll < 0.98 else 'Pending'
+
+
+def seed_order_chunk(index):
+    """
+    Create chunk `index` of the orders (CHUNK orders with their items) in
+    one transaction. The rows only depend on the seed and the chunk number,
+    so any number of workers produces the same data set.
+    """
+    context = _context
+    rng = chunk_rng(context['seed'], 'orders', index)
+    products = context['products']
+    product_weights = context['product_weights']
+    by_category = context['by_category']
+    customers = context['customers']
+    span = context['years'] * 365 * 86400
+    end = context['end']
+    count = min(context['chunk'], context['total'] - index * context['chunk'])
+
+    orders = []
+    baskets = []
+    for _ in range(count):
+        # More orders in recent months than years ago, and a few customers order a lot
+        age = span * rng.random() ** 1.6
+        created_at = end - timedelta(seconds=age)
+        customer_id, address = customers[int(len(customers) * rng.random() ** 2)]
+
+        first = rng.choices(products, cum_weights=product_weights)[0]
+        basket = {first[0]: first}
+        for _ in range(min(int(rng.expovariate(0.8)), 7)):
+            if rng.random() < SAME_CATEGORY_AFFINITY:
+                product = rng.choice(by_category[first[2]])
+            else:
+                product = rng.choices(products, cum_weights=product_weights)[0]
+            basket[product[0]] = product
+        lines = [(product_id, rng.choice((1, 1, 1, 2, 2, 3)), unit_price) for product_id, unit_price, _ in basket.values()]
+
+        status = order_status(rng, age / 86400)
+        cancelled = status == 'Cancelled'
+        refunded = cancelled and rng.random() < 0.5
+        orders.append(Order(
+            customer_id=customer_id,
+            status=status,
+            created_at=created_at,
+            total_price=sum(quantity * unit_price for _, quantity, unit_price in lines),
+            tracking_number=f'WP{rng.randrange(10 ** 10):010d}' if status == 'Completed' else None,
+            payment_method=rng.choice(PAYMENT_METHODS),
+            proof_of_payment=f'proof_of_payment/seed_{rng.randrange(10 ** 8):08d}.jpg',
+            order_delivery_address=address,
+            refund_status=('Refunded' if age > 14 * 86400 else 'To Be Refunded') if refunded else None,
+            refund_date=created_at + timedelta(days=rng.randint(2, 14)) if refunded and age > 14 * 86400 else None,
+        ))
+        baskets.append(lines)
+
+    with transaction.atomic():
+        # created_at is auto_now_add, so bulk_create stamps every order with
+        # now(); put the seeded dates back with one UPDATE per batch
+        created = [order.created_at for order in orders]
+        Order.objects.bulk_create(orders)
+        for order, created_at in zip(orders, created):
+            order.created_at = created_at
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+        items = [
+            OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity, price=unit_price)
+            for order, lines in zip(orders, baskets)
+            for product_id, quantity, unit_price in lines
+        ]
+        OrderItem.objects.bulk_create(items, batch_size=5000)
+    return count, len(items)
+
+
+def order_context(seed, total, chunk, years, end):
+    """What every order chunk needs, loaded once: products with popularity, customers"""
+    rng = chunk_rng(seed, 'popularity')
+    products = []
+    by_category = {}
+    for product_id, price, sale_price, on_sale, category_id in Product.objects.order_by('pk').values_list(
+        'pk', 'price', 'salePrice', 'onSale', 'category_id',
+    ):
+        product = (product_id, sale_price if on_sale and sale_price else price, category_id)
+        products.append(product)
+        by_category.setdefault(category_id, []).append(product)
+    customers = list(
+        User.objects.filter(role='customer').order_by('pk').values_list('pk', 'delivery_address')
+    )
+    customers = [(pk, address or delivery_address(rng)) for pk, address in customers]
+    # Best sellers: a long-tailed popularity per product
+    weights = list(accumulate(rng.paretovariate(1.2) for _ in products))
+    return {
+        'seed': seed, 'total': total, 'chunk': chunk, 'years': years, 'end': end,
+        'products': products, 'product_weights': weights, 'by_category': by_category, 'customers': customers,
+    }
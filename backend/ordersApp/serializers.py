@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import Order, Cart, CartItem, PaymentQrModel
+from .models import ArchivedOrder, Order, Cart, CartItem, PaymentQrModel
 from inventoryApp.models import Product
+from utils.fast_serializers import FastReadSerializer
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -32,3 +33,32 @@ class PaymentQrSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentQrModel
         fields = '__all__'
+
+
+# Fast read paths for the list endpoints; same output as the serializers above
+
+class OrderReadSerializer(FastReadSerializer):
+    class Meta:
+        model = Order
+        fields = ['id', 'customer', 'status', 'created_at', 'total_price', 'tracking_number',
+                  'payment_method', 'proof_of_payment', 'order_delivery_address',
+                  'refund_status', 'refund_proof', 'refund_date']
+
+
+class ArchivedOrderReadSerializer(FastReadSerializer):
+    """Archived orders in the same shape as OrderReadSerializer"""
+    class Meta:
+        model = ArchivedOrder
+        fields = OrderReadSerializer.Meta.fields
+
+
+class CartReadSerializer(FastReadSerializer):
+    class Meta:
+        model = Cart
+        fields = ['cartID', 'customer', 'date_added']
+
+
+class CartItemReadSerializer(FastReadSerializer):
+    class Meta:
+        model = CartItem
+        fields = ['id', 'cart', 'product.productID', 'product.name', 'product.price', 'product.image', 'quantity']
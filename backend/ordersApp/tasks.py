@@ -0,0 +1,38 @@
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import Order
+
+# Phone photos are downscaled to this many pixels on the longest side
+PROOF_MAX_DIMENSION = 2000
+PROOF_JPEG_QUALITY = 85
+ORIENTATION_TAG = 0x0112
+
+
+def normalize_proof_of_payment(order_id):
+    """Re-encode an uploaded proof of payment: apply EXIF rotation, downscale, strip metadata"""
+    order = Order.objects.only('id', 'proof_of_payment').get(id=order_id)
+    original_key = order.proof_of_payment.name
+    if not original_key:
+        return
+
+    with default_storage.open(original_key, 'rb') as source:
+        image = Image.open(source)
+        rotated = image.getexif().get(ORIENTATION_TAG, 1) != 1
+        if image.format == 'JPEG' and not rotated and max(image.size) <= PROOF_MAX_DIMENSION:
+            return
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PROOF_MAX_DIMENSION, PROOF_MAX_DIMENSION))
+        output = io.BytesIO()
+        image.convert('RGB').save(output, format='JPEG', quality=PROOF_JPEG_QUALITY, optimize=True)
+
+    # save() may pick another name if this one is taken; keep the one it returns
+    normalized_key = default_storage.save(f'proof_of_payment/order_{order.id}.jpg', ContentFile(output.getvalue()))
+    if Order.objects.filter(id=order.id, proof_of_payment=original_key).update(proof_of_payment=normalized_key):
+        default_storage.delete(original_key)
+    else:
+        # The proof was replaced meanwhile; this copy is not referenced
+        default_storage.delete(normalized_key)
@@ -1,3 +1,432 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from inventoryApp.models import Category, Product, StockMovement
+from userApp.models import User
+from utils.email_utils import build_html_email
+from utils.testing import api_client
+
+from .events import InProcessBroker, customer_channel
+from .idempotency import front_cache
+from .management.commands.sweep_stale_data import Command as SweepCommand
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, IdempotencyKey, Order, OrderItem, OrderNotification, RelatedProduct
+from .notifications import flush_order_notifications, queue_order_notifications
+from .recommendations import rebuild_related_products, record_completed_orders
+from .tasks import normalize_proof_of_payment
+
+
+class OrderTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Winches', description='')
+        self.product = Product.objects.create(name='Winch', description='', price=100, stock=10, category=self.category)
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+
+    def place_order(self, quantity=2, status='Pending'):
+        order = Order.objects.create(customer=self.customer, status=status, total_price=100 * quantity)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity, price=100)
+        return order
+
+
+class OrderCancellationTests(OrderTestCase):
+    def test_cancelling_twice_restocks_and_records_the_movement_once(self):
+        order = self.place_order(quantity=2)
+        client = api_client(self.admin)
+        client.put('/api/orders/', {'order_id': order.id, 'status': 'Cancelled'}, format='json')
+        client.put('/api/orders/', {'order_id': order.id, 'status': 'Cancelled'}, format='json')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 12)
+        self.assertEqual(
+            list(StockMovement.objects.filter(order_id=order.id).values_list('change', 'reason')),
+            [(2, 'order_cancelled')],
+        )
+
+
+    def test_updates_follow_the_bulk_endpoints_state_machine(self):
+        client = api_client(self.admin)
+        for current, requested in (('Completed', 'Pending'), ('Cancelled', 'Pending'), ('Pending', 'Shipped')):
+            with self.subTest(current=current, requested=requested):
+                order = self.place_order(status=current)
+                response = client.put('/api/orders/', {'order_id': order.id, 'status': requested}, format='json')
+                self.assertEqual(response.status_code, 400)
+                order.refresh_from_db()
+                self.assertEqual(order.status, current)
+
+    def test_refunds_can_be_recorded_without_changing_the_status(self):
+        order = self.place_order(status='Cancelled')
+        response = api_client(self.admin).put('/api/orders/', {'order_id': order.id, 'status': 'Cancelled', 'refund_status': 'Refunded'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.refund_status, 'Refunded')
+        self.assertFalse(StockMovement.objects.filter(order_id=order.id).exists())
+
+
+IN_MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ProofOfPaymentTests(OrderTestCase):
+    def presign(self, user, file_name='../../payment/images/gcash.PNG'):
+        with mock.patch('ordersApp.views.create_presigned_post', return_value={'url': 'https://s3', 'fields': {}}):
+            response = api_client(user).post('/api/orders/proof-of-payment-url/',
+                                             {'file_name': file_name, 'file_type': 'image/png'}, format='json')
+        return response.json()['key']
+
+    def checkout(self, user, key):
+        cart, _ = Cart.objects.get_or_create(customer=user)
+        item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        if '..' not in key:
+            default_storage.save(key, ContentFile(b'image'))
+        return api_client(user).post('/api/orders/', {
+            'items': str(item.id), 'total_price': '100', 'payment_method': 'GCASH',
+            'delivery_address': 'Somewhere', 'proof_of_payment_key': key,
+        })
+
+    def test_presigned_keys_are_random_names_under_the_users_folder(self):
+        key = self.presign(self.customer)
+        self.assertRegex(key, rf'^proof_of_payment/{self.customer.pk}/[0-9a-f]{{32}}\.png$')
+
+    def test_checkout_accepts_the_customers_own_upload(self):
+        response = self.checkout(self.customer, self.presign(self.customer))
+        self.assertEqual(response.status_code, 201)
+
+    def test_checkout_takes_the_stock_and_records_it_in_the_ledger(self):
+        response = self.checkout(self.customer, self.presign(self.customer))
+        self.assertEqual(response.status_code, 201)
+
+        movement = StockMovement.objects.get(product=self.product)
+        self.assertEqual((movement.change, movement.stock_after, movement.reason, movement.order_id),
+                         (-1, 9, 'order', response.json()['order_id']))
+
+    def test_checkout_rejects_other_customers_uploads_and_shop_images(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        for key in (self.presign(other), 'payment/images/gcash.png', f'proof_of_payment/{self.customer.pk}/../x.png'):
+            with self.subTest(key=key):
+                self.assertEqual(self.checkout(self.customer, key).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_normalizing_keeps_the_saved_name_and_removes_the_original(self):
+        upload = io.BytesIO()
+        Image.new('RGB', (3000, 1000)).save(upload, format='PNG')
+        original = default_storage.save(f'proof_of_payment/{self.customer.pk}/upload.png', ContentFile(upload.getvalue()))
+        order = Order.objects.create(customer=self.customer, total_price=100, proof_of_payment=original)
+        taken = default_storage.save(f'proof_of_payment/order_{order.id}.jpg', ContentFile(b'taken'))
+
+        normalize_proof_of_payment(order.id)
+
+        order.refresh_from_db()
+        self.assertNotIn(order.proof_of_payment.name, (original, taken))
+        self.assertTrue(default_storage.exists(order.proof_of_payment.name))
+        self.assertFalse(default_storage.exists(original))
+        with default_storage.open(order.proof_of_payment.name) as image:
+            self.assertEqual(Image.open(image).size, (2000, 667))
+
+
+class OrderEventsTests(OrderTestCase):
+    def poll(self, broker, **params):
+        with mock.patch('ordersApp.views.get_broker', return_value=broker):
+            return api_client(self.customer).get('/api/orders/events/', {'mode': 'poll', 'timeout': '0', **params})
+
+    def test_poll_returns_the_customers_next_event(self):
+        order = self.place_order()
+        broker = InProcessBroker()
+        subscribe = broker.subscribe
+
+        def subscribe_then_publish(channel, since):
+            subscription = subscribe(channel, since)
+            broker.publish(customer_channel(self.customer.pk), {'type': 'order.updated', 'order_id': order.id})
+            return subscription
+
+        with mock.patch.object(broker, 'subscribe', side_effect=subscribe_then_publish):
+            response = self.poll(broker, timeout='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'type': 'order.updated', 'order_id': order.id, 'id': 1})
+
+    def test_events_published_between_polls_are_replayed(self):
+        broker = InProcessBroker()
+        channel = customer_channel(self.customer.pk)
+        for order_id in (7, 8, 9):
+            broker.publish(channel, {'type': 'order.updated', 'order_id': order_id})
+        broker.publish(customer_channel(self.admin.pk), {'type': 'order.updated', 'order_id': 10})
+
+        self.assertEqual(self.poll(broker).status_code, 204)  # no id yet: only what happens from now on
+        self.assertEqual(self.poll(broker, since='1').json()['order_id'], 8)
+        self.assertEqual(self.poll(broker, since='2').json()['order_id'], 9)
+        self.assertEqual(self.poll(broker, since='3').status_code, 204)
+        self.assertEqual(self.poll(broker, since='-1').status_code, 400)
+
+    def test_streams_resume_from_last_event_id(self):
+        broker = InProcessBroker()
+        for order_id in (7, 8):
+            broker.publish(customer_channel(self.customer.pk), {'type': 'order.updated', 'order_id': order_id})
+
+        with mock.patch('ordersApp.views.get_broker', return_value=broker), \
+                override_settings(ORDER_EVENTS_STREAM_SECONDS=0.05, ORDER_EVENTS_HEARTBEAT_SECONDS=0.01):
+            response = api_client(self.customer).get('/api/orders/events/', HTTP_ACCEPT='text/event-stream',
+                                                     HTTP_LAST_EVENT_ID='1')
+            body = b''.join(response.streaming_content).decode()
+        self.assertIn('id: 2\nevent: order.updated\n', body)
+        self.assertNotIn('"order_id":7', body)
+
+    def test_clients_ahead_of_a_restarted_broker_get_everything_buffered(self):
+        broker = InProcessBroker()
+        broker.publish(customer_channel(self.customer.pk), {'type': 'order.updated', 'order_id': 7})
+        self.assertEqual(self.poll(broker, since='57').json()['order_id'], 7)
+
+    def test_invalid_timeouts_are_rejected_before_subscribing(self):
+        with mock.patch('ordersApp.views.get_broker') as get_broker:
+            for timeout in ('soon', 'nan', 'inf'):
+                with self.subTest(timeout=timeout):
+                    response = api_client(self.customer).get('/api/orders/events/', {'mode': 'poll', 'timeout': timeout})
+                    self.assertEqual(response.status_code, 400)
+        get_broker.assert_not_called()
+
+
+class OrderEmailTests(OrderTestCase):
+    def test_email_templates_are_read_from_disk_once(self):
+        # Django's default loaders cache compiled templates; emails must keep going through them
+        context = {'customer_name': 'Juan', 'orders': [{'order_id': 7, 'status': 'Completed', 'status_message': 'On its way'}]}
+        build_html_email('Order #7 Update', 'emails/order_updates.html', 'juan@example.com', dict(context))
+
+        with mock.patch.object(FilesystemLoader, 'get_contents') as get_contents:
+            email = build_html_email('Order #7 Update', 'emails/order_updates.html', 'juan@example.com', dict(context))
+        get_contents.assert_not_called()
+        html = email.alternatives[0][0]
+        self.assertIn('Order #7', html)
+        self.assertIn('Winch Point', html)  # from base_email.html
+
+
+class OrderNotificationTests(OrderTestCase):
+    def test_a_failed_send_only_retries_that_customers_email(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        first = self.place_order()
+        second = Order.objects.create(customer=other, total_price=100)
+        queue_order_notifications([(first, 'status', 'Completed'), (second, 'tracking', 'WP1')])
+        send_messages = EmailBackend.send_messages
+
+        def refuse_customer(backend, messages):
+            if messages[0].to == [self.customer.email]:
+                raise ConnectionError('Recipient refused')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=refuse_customer):
+            self.assertEqual(flush_order_notifications(window=0), (2, 1))
+        self.assertEqual([message.to for message in mail.outbox], [[other.email]])
+        self.assertEqual(list(OrderNotification.objects.values_list('customer', 'claim')), [(self.customer.pk, '')])
+
+        self.assertEqual(flush_order_notifications(window=0), (1, 1))
+        self.assertEqual([message.to for message in mail.outbox], [[other.email], [self.customer.email]])
+        self.assertFalse(OrderNotification.objects.exists())
+
+    def test_changes_claimed_by_another_flush_are_left_alone(self):
+        queue_order_notifications([(self.place_order(), 'status', 'Completed')])
+        OrderNotification.objects.update(claim='running', claimed_at=timezone.now())
+        self.assertEqual(flush_order_notifications(window=0), (1, 0))
+        self.assertEqual(mail.outbox, [])
+
+
+@override_settings(DEBUG=True)
+class SeedDataTests(TestCase):
+    @override_settings(DEBUG=False)
+    def test_refuses_to_run_without_debug(self):
+        with self.assertRaisesMessage(CommandError, 'the default database is production'):
+            call_command('seed_data', orders=1, users=1, products=1, stdout=io.StringIO())
+        self.assertFalse(User.objects.exists())
+
+    def test_seeded_orders_keep_their_historical_dates(self):
+        call_command('seed_data', orders=30, users=5, products=20, years=2, end='2024-06-30', batch_size=10, stdout=io.StringIO())
+
+        end = timezone.make_aware(datetime(2024, 6, 30, 23, 59))
+        dates = list(Order.objects.values_list('created_at', flat=True))
+        self.assertEqual(len(dates), 30)
+        self.assertTrue(all(end - timedelta(days=2 * 365) <= date <= end for date in dates))
+        # Orders placed afterwards are still stamped with the current time
+        self.assertTrue(Order._meta.get_field('created_at').auto_now_add)
+        order = Order.objects.create(customer=User.objects.first(), total_price=100)
+        self.assertGreater(order.created_at, end)
+
+
+class IdempotencyTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        front_cache._entries.clear()
+
+    def complete(self, order, user=None, key='retry-1'):
+        return api_client(user or self.admin).post(
+            '/api/orders/bulk-status/', {'transitions': [{'order_id': order.id, 'status': 'Completed'}]},
+            format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_a_retried_request_gets_the_stored_response(self):
+        order = self.place_order()
+        first = self.complete(order)
+        with mock.patch('ordersApp.views.apply_transitions') as apply_transitions:
+            retry = self.complete(order)
+        apply_transitions.assert_not_called()
+        self.assertEqual((retry.status_code, retry.json()), (200, first.json()))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_keys_are_scoped_to_the_authenticated_user(self):
+        other_admin = User.objects.create_user('admin2', 'admin2@example.com', 'pw', role='admin')
+        self.complete(self.place_order())
+        response = self.complete(self.place_order(), user=other_admin)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(list(IdempotencyKey.objects.order_by('owner').values_list('owner', flat=True)), ['admin', 'admin2'])
+
+    def test_the_views_writes_roll_back_with_a_failed_store(self):
+        order = self.place_order()
+        with mock.patch('ordersApp.idempotency.store_response', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.complete(order)
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'Pending')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class RelatedProductTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rope, self.hook, self.light = (
+            Product.objects.create(name=name, description='', price=100, stock=stock, category=self.category)
+            for name, stock in (('Rope', 5), ('Hook', 5), ('Light', 5))
+        )
+        self.orders = [
+            self.basket('Completed', self.product, self.rope, self.hook),
+            self.basket('Completed', self.product, self.rope),
+            self.basket('Cancelled', self.product, self.light),
+        ]
+
+    def basket(self, status, *products):
+        order = Order.objects.create(customer=self.customer, status=status, total_price=100 * len(products))
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=1, price=100) for product in products])
+        return order
+
+    def pairs(self):
+        return set(RelatedProduct.objects.values_list('product', 'related', 'count'))
+
+    def test_products_bought_together_are_ranked_by_completed_orders(self):
+        rebuild_related_products()
+        response = APIClient().get('/api/products/related/', {'product': self.product.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['name'], row['score']) for row in response.json()], [('Rope', 2), ('Hook', 1)])
+
+    def test_out_of_stock_and_requested_products_are_left_out(self):
+        rebuild_related_products()
+        Product.objects.filter(pk=self.hook.pk).update(stock=0)
+        response = APIClient().get('/api/products/related/', {'products': f'{self.product.pk},{self.rope.pk}'})
+        self.assertEqual(response.json(), [])
+
+    def test_recording_completed_orders_matches_a_full_rebuild(self):
+        record_completed_orders([order.id for order in self.orders[:2]])
+        recorded = self.pairs()
+        rebuild_related_products()
+        self.assertEqual(recorded, self.pairs())
+
+
+class SweepStaleDataTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        long_ago = timezone.now() - timedelta(days=365)
+        cart = Cart.objects.create(customer=self.customer)
+        self.stale_item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.fresh_item = CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        CartItem.objects.filter(pk=self.stale_item.pk).update(date_updated=long_ago)
+        self.empty_cart = Cart.objects.create(customer=self.admin)
+        Cart.objects.filter(pk=self.empty_cart.pk).update(date_added=long_ago)
+        User.objects.filter(pk=self.customer.pk).update(reset_code=123456, reset_code_sent_at=long_ago)
+        User.objects.filter(pk=self.admin.pk).update(reset_code=654321, reset_code_sent_at=timezone.now())
+        IdempotencyKey.objects.create(owner='customer', key='old', fingerprint='', status_code=201,
+                                      started_at=long_ago, expires_at=long_ago + timedelta(days=1))
+
+    def sweep(self, *args):
+        call_command('sweep_stale_data', *args, batch_size=1, pause=0, stdout=io.StringIO())
+
+    def test_stale_rows_are_reclaimed_and_fresh_ones_kept(self):
+        self.sweep()
+        self.assertEqual(list(CartItem.objects.values_list('pk', flat=True)), [self.fresh_item.pk])
+        self.assertFalse(Cart.objects.filter(pk=self.empty_cart.pk).exists())
+        self.assertEqual(dict(User.objects.values_list('username', 'reset_code')), {'customer': None, 'admin': 654321})
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_rows_that_stop_matching_mid_sweep_are_kept(self):
+        empty_carts = Cart.objects.filter(items__isnull=True)
+        expired_codes = User.objects.filter(reset_code_sent_at__lt=timezone.now() - timedelta(days=1))
+        # Between reading the batch's ids and applying it: an item is added, a code is sent again
+        CartItem.objects.create(cart=self.empty_cart, product=self.product, quantity=1)
+        User.objects.filter(pk=self.customer.pk).update(reset_code=111111, reset_code_sent_at=timezone.now())
+
+        self.assertEqual(SweepCommand.delete_batch(empty_carts, [self.empty_cart.pk]), 0)
+        self.assertEqual(SweepCommand.clear_reset_codes(expired_codes, [self.customer.pk]), 0)
+        self.assertTrue(CartItem.objects.filter(cart=self.empty_cart).exists())
+        self.assertEqual(User.objects.get(pk=self.customer.pk).reset_code, 111111)
+
+    def test_a_dry_run_changes_nothing(self):
+        self.sweep('--dry-run')
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertEqual(Cart.objects.count(), 2)
+        self.assertTrue(IdempotencyKey.objects.exists())
+
+
+class ArchiveOrdersTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_completed = self.place_order(status='Completed')
+        self.old_pending = self.place_order(status='Pending')
+        self.recent = self.place_order(status='Completed')
+        long_ago = timezone.make_aware(datetime(2020, 3, 15))
+        Order.objects.filter(pk__in=[self.old_completed.pk, self.old_pending.pk]).update(created_at=long_ago)
+
+    def order_ids(self, **params):
+        response = api_client(self.customer).get('/api/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(order['id'] for order in response.json())
+
+    def test_old_finished_orders_move_to_the_archive(self):
+        call_command('archive_orders', months=12, batch_size=1, pause=0, stdout=io.StringIO())
+
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [self.old_completed.pk])
+        item = ArchivedOrderItem.objects.get()
+        self.assertEqual((item.order_id, item.order_created_at.year), (self.old_completed.pk, 2020))
+        self.assertEqual(sorted(Order.objects.values_list('id', flat=True)), [self.old_pending.pk, self.recent.pk])
+        self.assertFalse(OrderItem.objects.filter(order_id=self.old_completed.pk).exists())
+
+    def test_order_history_includes_archived_orders_unless_excluded(self):
+        call_command('archive_orders', months=12, pause=0, stdout=io.StringIO())
+
+        everything = sorted([self.old_completed.pk, self.old_pending.pk, self.recent.pk])
+        self.assertEqual(self.order_ids(), everything)
+        self.assertEqual(self.order_ids(archived='only'), [self.old_completed.pk])
+        self.assertEqual(self.order_ids(archived='exclude'), [self.old_pending.pk, self.recent.pk])
+
+    def test_orders_waiting_for_a_refund_stay_live(self):
+        Order.objects.filter(pk=self.old_completed.pk).update(status='Cancelled', refund_status='To Be Refunded')
+        call_command('archive_orders', months=12, pause=0, stdout=io.StringIO())
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+        response = api_client(self.admin).put('/api/orders/', {'order_id': self.old_completed.pk, 'refund_status': 'Refunded'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        call_command('archive_orders', months=12, pause=0, stdout=io.StringIO())
+        self.assertEqual(ArchivedOrder.objects.get().refund_status, 'Refunded')
+
+    def test_a_dry_run_moves_nothing(self):
+        call_command('archive_orders', '--dry-run', months=12, stdout=io.StringIO())
+        self.assertFalse(ArchivedOrder.objects.exists())
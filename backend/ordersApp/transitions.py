@@ -0,0 +1,170 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from inventoryApp.catalog_cache import bump_catalog_version
+from inventoryApp.models import Product, StockMovement, adjust_category_counts
+from utils.background import run_in_background
+
+from .events import publish_order_event
+from .models import Order, OrderItem
+from .notifications import queue_order_notifications
+from .recommendations import record_completed_orders
+
+# Which status an order may move to from its current one. Staying Pending is
+# allowed so an admin can approve an order by giving it a tracking number.
+ORDER_TRANSITIONS = {
+    'Pending': {'Pending', 'Completed', 'Cancelled'},
+    'Completed': set(),
+    'Cancelled': set(),
+}
+
+class TransitionError(ValueError):
+    pass
+
+
+def check_transition(current, new_status):
+    """Raise TransitionError unless an order in `current` may move to `new_status`"""
+    if new_status not in ORDER_TRANSITIONS:
+        raise TransitionError(f'Unknown status {new_status!r}')
+    if new_status not in ORDER_TRANSITIONS[current]:
+        raise TransitionError(f'Cannot move a {current} order to {new_status}')
+
+
+def parse_transitions(raw):
+    """Validate the shape of a bulk request; returns a list of (order_id, status, tracking_number)"""
+    if not isinstance(raw, list) or not raw:
+        raise TransitionError('transitions must be a non-empty list')
+    if len(raw) > settings.ORDER_BULK_TRANSITION_LIMIT:
+        raise TransitionError(f'At most {settings.ORDER_BULK_TRANSITION_LIMIT} transitions per request')
+
+    parsed = []
+    seen = set()
+    for entry in raw:
+        if not isinstance(entry, dict):
+            raise TransitionError('Each transition must be an object')
+        try:
+            order_id = int(entry.get('order_id'))
+        except (TypeError, ValueError):
+            raise TransitionError(f'Invalid order_id: {entry.get("order_id")!r}')
+        new_status = entry.get('status')
+        if new_status not in ORDER_TRANSITIONS:
+            raise TransitionError(f'Order {order_id}: unknown status {new_status!r}')
+        if order_id in seen:
+            raise TransitionError(f'Order {order_id} appears more than once')
+        seen.add(order_id)
+        parsed.append((order_id, new_status, entry.get('tracking_number') or None))
+    return parsed
+
+
+def apply_transitions(transitions):
+    """
+    Move a batch of orders to new statuses in one transaction. Entries the
+    state machine rejects are skipped and reported; the rest are applied
+    with a handful of set-based queries whatever the batch size.
+
+    Returns (applied order ids, {order_id: error}).
+    """
+    errors = {}
+    with transaction.atomic():
+        # Only what the state machine and the order events need
+        orders = (
+            Order.objects.select_for_update()
+            .only('id', 'status', 'tracking_number', 'customer_id', 'refund_status', 'refund_date')
+            .in_bulk([order_id for order_id, _, _ in transitions])
+        )
+
+        changed = []
+        cancelled_ids = []
+        notifications = []  # (order, kind, value) for the customers' combined emails
+        for order_id, new_status, tracking_number in transitions:
+            order = orders.get(order_id)
+            if order is None:
+                errors[order_id] = 'Order not found'
+                continue
+            try:
+                check_transition(order.status, new_status)
+            except TransitionError as e:
+                errors[order_id] = str(e)
+                continue
+            tracking_changed = bool(tracking_number) and tracking_number != order.tracking_number
+            if new_status == order.status and not tracking_changed:
+                errors[order_id] = 'Nothing to change'
+                continue
+
+            if new_status != order.status:
+                notifications.append((order, 'status', new_status))
+            if tracking_changed:
+                notifications.append((order, 'tracking', tracking_number))
+            order.status = new_status
+            if tracking_changed:
+                order.tracking_number = tracking_number
+            if new_status == 'Cancelled':
+                cancelled_ids.append(order_id)
+            changed.append(order)
+
+        Order.objects.bulk_update(changed, ['status', 'tracking_number'], batch_size=500)
+        if cancelled_ids:
+            restock_orders(cancelled_ids)
+        for order in changed:
+            publish_order_event(order, 'order.updated')
+        queue_order_notifications(notifications)
+
+    completed = [order.id for order in changed if order.status == 'Completed']
+    if completed:
+        run_in_background(record_completed_orders, completed)
+    return [order.id for order in changed], errors
+
+
+def restock_orders(order_ids):
+    """Return the items of cancelled orders to stock with a single UPDATE"""
+    rows = list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .values('order_id', 'product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by('order_id')
+    )
+    if not rows:
+        return
+
+    totals = defaultdict(int)
+    for row in rows:
+        totals[row['product_id']] += row['quantity']
+
+    products = Product.objects.select_for_update().only('productID', 'stock', 'category_id').in_bulk(list(totals))
+    stock_before = {pk: product.stock for pk, product in products.items()}
+    Product.objects.filter(pk__in=list(totals)).update(
+        stock=F('stock') + Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in totals.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+    # The UPDATE skipped Product.save(), so keep the category counters and
+    # catalog cache in step here: only products coming back in stock matter.
+    back_in_stock = defaultdict(int)
+    for pk, quantity in totals.items():
+        if pk in products and stock_before[pk] <= 0 < stock_before[pk] + quantity:
+            back_in_stock[products[pk].category_id] += 1
+    for category_id, count in back_in_stock.items():
+        adjust_category_counts(category_id, 0, count)
+    bump_catalog_version()
+
+    running = dict(stock_before)
+    movements = []
+    for row in rows:
+        pk = row['product_id']
+        if pk not in running:
+            continue
+        running[pk] += row['quantity']
+        movements.append(StockMovement(
+            product_id=pk,
+            change=row['quantity'],
+            stock_after=running[pk],
+            reason='order_cancelled',
+            order_id=row['order_id'],
+        ))
+    StockMovement.objects.bulk_create(movements, batch_size=500)
@@ -1,11 +1,14 @@
 from django.urls import path
-from .views import QRCrud, OrderCrud, CartCrud, GeneratePresignedUrl, SendResetCodeView, RevenueReportView
+from .views import QRCrud, OrderCrud, BulkOrderStatusView, CartCrud, GeneratePresignedUrl, OrderEventsView, RelatedProductsView, SendResetCodeView, RevenueReportView
 
 urlpatterns = [
     path('qr/', QRCrud.as_view(), name='qr-crud'),
     path('orders/', OrderCrud.as_view(), name='order-crud'),
+    path('orders/bulk-status/', BulkOrderStatusView.as_view(), name='order-bulk-status'),
+    path('orders/events/', OrderEventsView.as_view(), name='order-events'),
+    path('products/related/', RelatedProductsView.as_view(), name='related-products'),
     path('cart/', CartCrud.as_view(), name='cart-crud'),
-    path('generate-presigned-url/', GeneratePresignedUrl.as_view(), name='generate-presigned-url'),
+    path('orders/proof-of-payment-url/', GeneratePresignedUrl.as_view(), name='proof-of-payment-url'),
     path('send-reset-code/', SendResetCodeView.as_view(), name='send-reset-code'),
     path('reports/revenue/', RevenueReportView.as_view(), name='revenue-report'),
 ]
\ No newline at end of file
@@ -3,20 +3,45 @@ from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Cart, CartItem, Order, OrderItem, PaymentQrModel
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem, PaymentQrModel
 from .serializers import CartItemSerializer, CartSerializer, OrderSerializer, PaymentQrSerializer
+from .serializers import ArchivedOrderReadSerializer, CartItemReadSerializer, CartReadSerializer, OrderReadSerializer
+from .archive import ORDER_STORES
+from .idempotency import idempotent
 from django.conf import settings
 import jwt
 from django.contrib.auth import get_user_model
-from inventoryApp.models import Product
+from inventoryApp.models import Product, record_stock_movements
 import boto3
 from botocore.exceptions import ClientError
 from django.core.mail import send_mail
-from utils.email_utils import send_html_email
+from utils.db_router import read_from_replica
+from utils.background import run_in_background
+from django.core.files.storage import default_storage
+from .tasks import normalize_proof_of_payment
+from .events import ADMIN_CHANNEL, customer_channel, get_broker, publish_order_event
+from .transitions import TransitionError, apply_transitions, check_transition, parse_transitions, restock_orders
+from .recommendations import record_completed_orders, related_product_scores
+from .notifications import queue_order_notifications
+from inventoryApp.serializers import InventoryReadSerializer
+from utils.fast_serializers import InvalidFieldsError, sparse_fieldset
+from utils.renderers import EventStreamRenderer, ORJSONRenderer
+from utils.single_flight import cached_single_flight
+from utils.throttling import ResetCodeSendThrottle
+from utils.tracing import span
 import io
+import logging
+import math
+import os
+import re
+import uuid
 import calendar
+from collections import Counter
+import time
+import orjson
 from datetime import datetime, timedelta
-from django.http import FileResponse, HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.db import transaction
 from django.db.models import Sum, Count
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -28,20 +53,37 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
 # Create your views here.
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# GeneratePresignedUrl hands each customer keys under their own folder,
+# proof_of_payment/<user id>/<random hex><ext>; checkout only accepts those
+PROOF_OF_PAYMENT_PREFIX = 'proof_of_payment/'
+PROOF_OF_PAYMENT_NAME_RE = re.compile(r'^[0-9a-f]{32}(\.[a-z0-9]{1,5})?$')
+
+
+def proof_of_payment_prefix(user):
+    return f'{PROOF_OF_PAYMENT_PREFIX}{user.pk}/'
+
+
+def is_own_proof_of_payment_key(user, key):
+    prefix = proof_of_payment_prefix(user)
+    return key.startswith(prefix) and bool(PROOF_OF_PAYMENT_NAME_RE.match(key[len(prefix):]))
+
 
 def create_presigned_post(bucket_name, object_name, fields=None, conditions=None, expiration=3600):
     """Generate a presigned URL S3 POST request to upload a file"""
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
-    try:
-        response = s3_client.generate_presigned_post(bucket_name, object_name, Fields=fields, Conditions=conditions, ExpiresIn=expiration)
-    except ClientError as e:
-        print(e)
-        return None
+    with span('s3.presign_post', **{'s3.bucket': bucket_name, 's3.key': object_name}):
+        s3_client = boto3.client(
+            's3',
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME
+        )
+        try:
+            response = s3_client.generate_presigned_post(bucket_name, object_name, Fields=fields, Conditions=conditions, ExpiresIn=expiration)
+        except ClientError:
+            logger.exception('Could not create presigned POST for %s', object_name)
+            return None
     return response
 
 
@@ -56,14 +98,20 @@ class GeneratePresignedUrl(APIView):
             return Response({'error': 'File name and file type are required'}, status=400)
 
         bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-        object_name = f"payment/images/{file_name}"
+        # The client's file name only contributes its extension; the key is
+        # ours, so one customer can't point at another's upload
+        extension = os.path.splitext(file_name)[1].lower()
+        if not re.fullmatch(r'\.[a-z0-9]{1,5}', extension):
+            extension = ''
+        object_name = f'{proof_of_payment_prefix(request.user)}{uuid.uuid4().hex}{extension}'
 
         presigned_post = create_presigned_post(bucket_name, object_name, fields={"Content-Type": file_type}, conditions=[{"Content-Type": file_type}])
 
         if presigned_post is None:
             return Response({'error': 'Could not generate presigned URL'}, status=500)
 
-        return Response({'url': presigned_post['url'], 'fields': presigned_post['fields']}, status=200)
+        # `key` is what checkout takes as proof_of_payment_key once the upload is done
+        return Response({'url': presigned_post['url'], 'fields': presigned_post['fields'], 'key': object_name}, status=200)
 
 class QRCrud(APIView):
     permission_classes = [IsAuthenticated]
@@ -121,15 +169,31 @@ class OrderCrud(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Old orders live in the archive tables; ?archived=exclude skips them,
+        # ?archived=only returns nothing else
+        archived = request.query_params.get('archived', 'include')
+        if archived not in ('include', 'exclude', 'only'):
+            return Response({'error': 'archived must be include, exclude or only'}, status=status.HTTP_400_BAD_REQUEST)
+
         if role == 'admin':
             orders = Order.objects.all()
+            archived_orders = ArchivedOrder.objects.all()
         else:
             user = get_object_or_404(User, username=username)
             orders = Order.objects.filter(customer=user)
+            archived_orders = ArchivedOrder.objects.filter(customer=user)
 
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        try:
+            data = []
+            if archived != 'exclude':
+                data += ArchivedOrderReadSerializer(archived_orders.order_by('created_at'), **sparse_fieldset(request)).data
+            if archived != 'only':
+                data += OrderReadSerializer(orders, **sparse_fieldset(request)).data
+        except InvalidFieldsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
 
+    @idempotent
     def post(self, request, format=None):
         access_token = request.COOKIES.get('jwt_access_token')
         if not access_token:
@@ -151,7 +215,10 @@ class OrderCrud(APIView):
             total_price = request.data.get('total_price')
             payment_method = request.data.get('payment_method')
             delivery_address = request.data.get('delivery_address')
-            proof_of_payment = request.FILES.get('proof_of_payment')
+            # Preferred: the key of an image the client already uploaded to S3
+            # through GeneratePresignedUrl. A multipart file is still accepted.
+            proof_of_payment_key = request.data.get('proof_of_payment_key')
+            proof_of_payment = proof_of_payment_key or request.FILES.get('proof_of_payment')
 
             # Validate required fields
             if not all([items, total_price, payment_method, delivery_address, proof_of_payment]):
@@ -166,6 +233,15 @@ class OrderCrud(APIView):
                     }
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            if proof_of_payment_key:
+                # Cheap HEAD request instead of streaming the image through this worker
+                if not is_own_proof_of_payment_key(user, proof_of_payment_key):
+                    return Response({'error': 'Invalid proof of payment key'}, status=status.HTTP_400_BAD_REQUEST)
+                with span('s3.head_object', **{'s3.key': proof_of_payment_key}):
+                    uploaded = default_storage.exists(proof_of_payment_key)
+                if not uploaded:
+                    return Response({'error': 'Proof of payment has not been uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+
             # Convert items string to list
             selected_items = [int(item) for item in items.split(',') if item]
             cart_items = CartItem.objects.filter(cart=cart, id__in=selected_items)
@@ -193,9 +269,16 @@ class OrderCrud(APIView):
                 item.delete()
             
             # Reduce stock based on order items
-            for item in order.items.all():
+            movements = []
+            for item in order.items.select_related('product'):
                 item.product.stock -= item.quantity
                 item.product.save()
+                movements.append((item.product, -item.quantity))
+            record_stock_movements(movements, 'order', order_id=order.id)
+
+            # Downscale / re-encode the photo after the response is sent
+            run_in_background(normalize_proof_of_payment, order.id)
+            publish_order_event(order, 'order.created')
 
             return Response({
                 'message': 'Order created successfully',
@@ -209,6 +292,7 @@ class OrderCrud(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+    @idempotent
     def put(self, request):
         access_token = request.COOKIES.get('jwt_access_token')
         if not access_token:
@@ -231,127 +315,61 @@ class OrderCrud(APIView):
         if not order_id:
                 return Response({'error': 'Order ID is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if role == 'admin':
-                order = get_object_or_404(Order, id=order_id)
-        else:
+        with transaction.atomic():
+            orders = Order.objects.select_for_update()
+            if role == 'admin':
+                order = get_object_or_404(orders, id=order_id)
+            else:
                 user = get_object_or_404(User, username=username)
-                order = get_object_or_404(Order, id=order_id, customer=user)
-            
-        old_status = order.status
-        old_tracking = order.tracking_number
-        old_refund_status = order.refund_status
-            
-        order.status = request.data.get('status', order.status)
-        order.tracking_number = request.data.get('tracking_number', order.tracking_number)            
-        order.payment_method = request.data.get('payment_method', order.payment_method)
-        order.proof_of_payment = request.data.get('proof_of_payment', order.proof_of_payment)
-        
-        # Add handling for refund fields
-        order.refund_status = request.data.get('refund_status', order.refund_status)
-        order.refund_proof = request.data.get('refund_proof', order.refund_proof)
-        order.refund_date = request.data.get('refund_date', order.refund_date)
-            
-            # Handle status change notifications
-        if order.status != old_status:
-                status_messages = {
-                    'Pending': 'Your order is now being processed.',
-                    'Completed': 'Your order has been completed and is on its way!',
-                    'Cancelled': 'Your order has been cancelled. Any payments will be refunded.'
-                }
-                
-                send_mail(
-                    f'Order #{order.id} Status Update',
-                    f'Dear Customer,\n\n{status_messages.get(order.status, "Your order status has been updated.")}\n\nOrder ID: {order.id}\nNew Status: {order.status}',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [order.customer.email],
-                    fail_silently=True,
-                )
+                order = get_object_or_404(orders, id=order_id, customer=user)
 
-            # Handle tracking number updates
-        if order.tracking_number and order.tracking_number != old_tracking:
-                # Keep the existing plain text email
-                send_mail(
-                    f'Tracking Number Updated for Order #{order.id}',
-                    f'Dear Customer,\n\nYour order tracking number has been updated.\n\nOrder ID: {order.id}\nTracking Number: {order.tracking_number}',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [order.customer.email],
-                    fail_silently=True,
-                )
-                
-                # Add HTML email version
+            old_status = order.status
+            old_tracking = order.tracking_number
+            old_refund_status = order.refund_status
+
+            # Same state machine as the bulk endpoint; leaving the status as
+            # it is (e.g. to record a refund) is not a transition
+            new_status = request.data.get('status', order.status)
+            if new_status != old_status:
                 try:
-                    # Get items for the order
-                    items_context = []
-                    for item in order.items.all():
-                        items_context.append({
-                            'name': item.product.name,
-                            'quantity': item.quantity,
-                            'price': item.price
-                        })
-                        
-                    customer_name = f"{order.customer.first_name} {order.customer.last_name}"
-                    
-                    send_html_email(
-                        f'Your Order #{order.id} is Approved and Ready to Ship!',
-                        'emails/order_approved.html',
-                        order.customer.email,
-                        {
-                            'order_id': order.id,
-                            'customer_name': customer_name,
-                            'tracking_number': order.tracking_number,
-                            'items': items_context,
-                            'total_price': order.total_price,
-                            'tracking_url': f"{settings.SITE_URL}/track/{order.tracking_number}",
-                            'site_url': settings.SITE_URL
-                        }
-                    )
-                except Exception as e:
-                    print(f"HTML email could not be sent: {e}")
-                    # Plain text email already sent as fallback
-
-            # Handle cancellation and stock updates
-        if order.status == 'Cancelled':
-                items_info = []
-                for item in order.items.all():
-                    item.product.stock += item.quantity
-                    item.product.save()
-                    items_info.append(f"- {item.quantity}x {item.product.name}")
-                
-                send_mail(
-                    f'Order #{order.id} Cancelled',
-                    f'Dear Customer,\n\nYour order has been cancelled. The following items have been returned to stock:\n\n{"\n".join(items_info)}\n\nIf you have any questions, please contact our support team.',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [order.customer.email],
-                    fail_silently=True,
-                )
-        
-        # Add email notification for refund status changes
-        if order.refund_status and order.refund_status != old_refund_status:
-            try:
-                customer = order.user if isinstance(order.user, User) else User.objects.get(id=order.user)
-                if customer.email:
-                    refund_template = 'emails/order_refund_status.html'
-                    send_html_email(
-                        subject=f"Order #{order.id} Refund Status: {order.refund_status}",
-                        template_name=refund_template,
-                        to_email=customer.email,
-                        context={
-                            'customer_name': f"{customer.first_name} {customer.last_name}",
-                            'order_id': order.id,
-                            'refund_status': order.refund_status,
-                            'refund_date': order.refund_date,
-                            'items': OrderItem.objects.filter(order=order),
-                        }
-                    )
-            except Exception as e:
-                print(f"Failed to send refund notification email: {e}")
-            
-        order.save()
+                    check_transition(old_status, new_status)
+                except TransitionError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            order.status = new_status
+            order.tracking_number = request.data.get('tracking_number', order.tracking_number)
+            order.payment_method = request.data.get('payment_method', order.payment_method)
+            order.proof_of_payment = request.data.get('proof_of_payment', order.proof_of_payment)
+
+            # Add handling for refund fields
+            order.refund_status = request.data.get('refund_status', order.refund_status)
+            order.refund_proof = request.data.get('refund_proof', order.refund_proof)
+            order.refund_date = request.data.get('refund_date', order.refund_date)
+
+            order.save()
+            if order.status == 'Cancelled' and old_status != 'Cancelled':
+                restock_orders([order.id])
+
+            # Customers get one combined email per notification window
+            changes = []
+            if order.status != old_status:
+                changes.append((order, 'status', order.status))
+            if order.tracking_number and order.tracking_number != old_tracking:
+                changes.append((order, 'tracking', order.tracking_number))
+            if order.refund_status and order.refund_status != old_refund_status:
+                changes.append((order, 'refund', order.refund_status))
+            queue_order_notifications(changes)
+            if (order.status, order.tracking_number, order.refund_status) != (old_status, old_tracking, old_refund_status):
+                publish_order_event(order, 'order.updated')
+
+        if order.status == 'Completed' and old_status != 'Completed':
+            run_in_background(record_completed_orders, [order.id])
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
         
 
+    @idempotent
     def delete(self, request, format=None):
         order_id = request.data.get('order_id')
         status_change = request.data.get('status', 'Cancelled')
@@ -360,52 +378,25 @@ class OrderCrud(APIView):
             return Response({'message': 'Order ID is required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            order = Order.objects.get(id=order_id)
-            
-            # Only restore stock if the order is being cancelled
-            if status_change == 'Cancelled' and order.status != 'Cancelled':
-                # Get items and prepare email data
-                items_info = []
-                for order_item in OrderItem.objects.filter(order=order):
-                    # Get the product and restore stock
-                    product = Product.objects.get(productID=order_item.product)
-                    product.stock += order_item.quantity
-                    product.save()
-                    
-                    # Add item info for the email
-                    items_info.append({
-                        'name': product.name,
-                        'quantity': order_item.quantity
-                    })
-                
-                # Get customer information
-                try:
-                    customer = User.objects.get(username=order.customer)
-                    customer_email = customer.email
-                    customer_name = f"{customer.first_name} {customer.last_name}"
-                except User.DoesNotExist:
-                    customer_email = None
-                    customer_name = "Customer"
-                
-                # Send email notification if we have the customer email
-                if customer_email:
-                    # Send HTML email
-                    send_html_email(
-                        subject=f'Your Order #{order.id} Has Been Cancelled',
-                        template_name='emails/order_cancelled.html',
-                        to_email=customer_email,
-                        context={
-                            'customer_name': customer_name,
-                            'order_id': order.id,
-                            'items': items_info,
-                            'site_url': settings.SITE_URL
-                        }
-                    )
-            
-            # Update the order status
-            order.status = status_change
-            order.save()
-            
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(id=order_id)
+                old_status = order.status
+                if status_change != old_status:
+                    try:
+                        check_transition(old_status, status_change)
+                    except TransitionError as e:
+                        return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+                # Update the order status
+                order.status = status_change
+                order.save()
+                # Only restore stock if the order is being cancelled
+                if order.status == 'Cancelled' and old_status != 'Cancelled':
+                    restock_orders([order.id])
+                publish_order_event(order, 'order.updated')
+                if order.status != old_status:
+                    queue_order_notifications([(order, 'status', order.status)])
+
             return Response({'message': 'Order updated successfully'}, status=status.HTTP_200_OK)
         except Order.DoesNotExist:
             return Response({'message': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -413,6 +404,164 @@ class OrderCrud(APIView):
             return Response({'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BulkOrderStatusView(APIView):
+    """
+    Admin: approve, complete or cancel many orders in one request.
+    Body: {"transitions": [{"order_id": 1, "status": "Completed", "tracking_number": "..."}]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request, format=None):
+        access_token = request.COOKIES.get('jwt_access_token')
+        if not access_token:
+            return Response({'error': 'Please login first'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return Response({'error': 'Token has expired'}, status=status.HTTP_401_UNAUTHORIZED)
+        except jwt.InvalidTokenError:
+            return Response({'error': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+        if payload.get('role') != 'admin':
+            return Response({'error': 'Only admins can update orders in bulk'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            transitions = parse_transitions(request.data.get('transitions'))
+        except TransitionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        updated, errors = apply_transitions(transitions)
+        return Response({
+            'updated': updated,
+            'errors': [{'order_id': order_id, 'error': error} for order_id, error in errors.items()],
+        }, status=status.HTTP_200_OK)
+
+
+class RelatedProductsView(APIView):
+    """
+    "Frequently bought together": ?product=<id> for a product page or
+    ?products=<id>,<id> for a whole cart; ?limit= (default 8).
+    """
+
+    def get(self, request, format=None):
+        raw_ids = request.query_params.get('products') or request.query_params.get('product') or ''
+        try:
+            product_ids = [int(product_id) for product_id in raw_ids.split(',') if product_id]
+            limit = min(int(request.query_params.get('limit', 8)), 50)
+        except ValueError:
+            return Response({'error': 'product ids and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not product_ids:
+            return Response({'error': 'product or products is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scores = dict(related_product_scores(product_ids, limit))
+        try:
+            products = InventoryReadSerializer(Product.objects.filter(pk__in=scores), **sparse_fieldset(request)).data
+        except InvalidFieldsError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        products_by_id = {product['productID']: product for product in products if 'productID' in product}
+        return Response([
+            {**products_by_id[product_id], 'score': score}
+            for product_id, score in scores.items()
+            if product_id in products_by_id
+        ])
+
+
+class OrderEventsView(APIView):
+    """
+    Push order status / tracking / refund changes to the browser instead of
+    having it poll GET /orders/. Customers see their own orders, admins see
+    every order.
+
+    Default is a text/event-stream (Server-Sent Events). ?mode=poll answers
+    with the next event as JSON, or 204 if none arrived in time.
+
+    Every event carries an id, increasing per channel. A client picks up
+    where it left off by sending the last id it saw as ?since= (polling)
+    or Last-Event-ID (EventSource does this itself when it reconnects);
+    events from the last ORDER_EVENTS_REPLAY_SECONDS are replayed first.
+    Without one it only hears about changes from now on.
+
+    Each open stream holds a worker for ORDER_EVENTS_STREAM_SECONDS. On sync
+    gunicorn workers keep that at the long-poll length (the default) and let
+    EventSource reconnect; longer streams need gevent/async workers. With
+    more than one worker process the broker must be Redis (REDIS_URL), or
+    clients only hear about changes made by their own worker.
+    """
+    renderer_classes = [ORJSONRenderer, EventStreamRenderer]
+
+    def get(self, request, format=None):
+        access_token = request.COOKIES.get('jwt_access_token')
+        if not access_token:
+            return Response({'error': 'Please login first'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
+            username = payload.get('username')
+            role = payload.get('role')
+            if not username:
+                return Response({'error': 'Invalid token payload'}, status=status.HTTP_401_UNAUTHORIZED)
+        except jwt.ExpiredSignatureError:
+            return Response({'error': 'Token has expired'}, status=status.HTTP_401_UNAUTHORIZED)
+        except jwt.InvalidTokenError:
+            return Response({'error': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        since = request.query_params.get('since', request.headers.get('Last-Event-ID'))
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                since = -1
+            if since < 0:
+                return Response({'error': 'Invalid event id'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if role == 'admin':
+            channel = ADMIN_CHANNEL
+        else:
+            user = get_object_or_404(User, username=username)
+            channel = customer_channel(user.pk)
+
+        if request.query_params.get('mode') == 'poll':
+            try:
+                timeout = float(request.query_params.get('timeout', settings.ORDER_EVENTS_POLL_SECONDS))
+            except ValueError:
+                timeout = math.nan
+            if not math.isfinite(timeout):
+                return Response({'error': 'Invalid timeout'}, status=status.HTTP_400_BAD_REQUEST)
+            timeout = min(max(timeout, 0), settings.ORDER_EVENTS_POLL_SECONDS)
+
+            subscription = get_broker().subscribe(channel, since)
+            try:
+                event = subscription.get(timeout=timeout)
+            finally:
+                subscription.close()
+            if event is None:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response(event)
+
+        subscription = get_broker().subscribe(channel, since)
+        response = StreamingHttpResponse(self.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def stream(subscription):
+        deadline = time.monotonic() + settings.ORDER_EVENTS_STREAM_SECONDS
+        try:
+            # Ask EventSource to reconnect quickly once the stream is closed
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=settings.ORDER_EVENTS_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {orjson.dumps(event).decode()}\n\n"
+        finally:
+            subscription.close()
+
+
 class CartCrud(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, format=None):
@@ -426,8 +575,12 @@ class CartCrud(APIView):
             if not cart:
                 user = get_object_or_404(User, username=decoded_token['username'])
                 cart = Cart.objects.create(customer=user)
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
+            # ?fields= / ?exclude= apply to the cart items
+            data = CartReadSerializer(Cart.objects.filter(pk=cart.pk)).data[0]
+            data['items'] = CartItemReadSerializer(CartItem.objects.filter(cart=cart), **sparse_fieldset(request)).data
+            return Response(data)
+        except InvalidFieldsError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except jwt.ExpiredSignatureError:
             return Response({'message': 'Token has expired'}, status=status.HTTP_400_BAD_REQUEST)
         except jwt.InvalidTokenError:
@@ -435,6 +588,7 @@ class CartCrud(APIView):
         
        
 
+    @idempotent
     def post(self, request, format=None):
         access_token = request.COOKIES.get('jwt_access_token')
         if not access_token:
@@ -458,7 +612,7 @@ class CartCrud(APIView):
                         return Response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
 
                     product = get_object_or_404(Product, productID=product_id)
-                    print(f"product stock: {product.stock}, quantity: {quantity}")
+                    logger.debug('Adding to cart', extra={'product_id': product.productID, 'stock': product.stock, 'quantity': quantity})
                     
                     # Fixed stock check condition
                     if product.stock < quantity:
@@ -550,20 +704,65 @@ class CartCrud(APIView):
 
 
 class SendResetCodeView(APIView):
+    throttle_classes = [ResetCodeSendThrottle]
+
     def post(self, request):
         email = request.data.get('email')
         reset_code = request.data.get('reset_code')
         
-        send_mail(
-            'Password Reset Code',
-            f'Your password reset code is {reset_code}',
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
+        with span('smtp.send', **{'email.messages': 1}):
+            send_mail(
+                'Password Reset Code',
+                f'Your password reset code is {reset_code}',
+                settings.DEFAULT_FROM_EMAIL,
+                [email],
+                fail_silently=False,
+            )
         return Response({'message': 'Reset code sent successfully'}, status=status.HTTP_200_OK)
 
 
+def monthly_revenue(year):
+    """Completed orders, revenue and top products for each month of `year`"""
+    monthly_data = []
+    
+    # Reports are read-only aggregations, so run them against a replica
+    with read_from_replica(), span('report.revenue_data', **{'report.year': year}):
+        for month in range(1, 13):
+            total_sales = 0
+            total_revenue = 0
+            product_counts = Counter()
+
+            # Older months may be partly or wholly in the order archive
+            for order_model, item_model in ORDER_STORES:
+                # Get orders for this month
+                month_orders = order_model.objects.filter(
+                    created_at__year=year,
+                    created_at__month=month,
+                    status='Completed'
+                )
+
+                # Calculate metrics
+                total_sales += month_orders.count()
+                total_revenue += month_orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
+
+                # Get product sales for this month
+                for p in item_model.objects.filter(
+                    order__in=month_orders
+                ).values('product__name').annotate(count=Count('id')):
+                    product_counts[p['product__name']] += p['count']
+        
+            top_products_list = [f"{name} ({count})" for name, count in product_counts.most_common(3)]
+            top_products_str = ", ".join(top_products_list) if top_products_list else "None"
+        
+            monthly_data.append({
+                'Month': calendar.month_name[month],
+                'Total Orders': total_sales,
+                'Total Revenue': total_revenue,
+                'Top Products': top_products_str
+            })
+    return monthly_data
+
+
 class RevenueReportView(APIView):
     """
     Generate and download revenue reports in PDF or Excel format
@@ -578,38 +777,14 @@ class RevenueReportView(APIView):
             return Response({"error": "Invalid report type. Use 'pdf' or 'excel'."}, 
                             status=status.HTTP_400_BAD_REQUEST)
             
-        # Get monthly sales data for the specified year
-        monthly_data = []
-        
-        for month in range(1, 13):
-            # Get orders for this month
-            month_orders = Order.objects.filter(
-                created_at__year=year,
-                created_at__month=month,
-                status='Completed'
-            )
-            
-            # Calculate metrics
-            total_sales = month_orders.count()
-            total_revenue = month_orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
-            
-            # Get product sales for this month
-            top_products = OrderItem.objects.filter(
-                order__in=month_orders
-            ).values('product__name').annotate(
-                count=Count('id'),
-                total=Sum('product__price')
-            ).order_by('-count')[:3]
-            
-            top_products_list = [f"{p['product__name']} ({p['count']})" for p in top_products]
-            top_products_str = ", ".join(top_products_list) if top_products_list else "None"
-            
-            monthly_data.append({
-                'Month': calendar.month_name[month],
-                'Total Orders': total_sales,
-                'Total Revenue': total_revenue,
-                'Top Products': top_products_str
-            })
+        # Get monthly sales data for the specified year (cached; one worker rebuilds it)
+        monthly_data = cached_single_flight(
+            f'reports:revenue:{year}',
+            lambda: monthly_revenue(year),
+            settings.REPORT_CACHE_TIMEOUT,
+            stale_key=f'reports:revenue:{year}:stale',
+            stale_timeout=settings.REPORT_STALE_SECONDS,
+        )
         
         # Create DataFrame
         df = pd.DataFrame(monthly_data)
@@ -622,47 +797,48 @@ class RevenueReportView(APIView):
             # Create a Pandas Excel writer
             writer = pd.ExcelWriter(output, engine='xlsxwriter')
             
-            # Write the DataFrame to the Excel file
-            df.to_excel(writer, sheet_name='Monthly Revenue', index=False)
-            
-            # Access the XlsxWriter workbook and worksheet objects
-            workbook = writer.book
-            worksheet = writer.sheets['Monthly Revenue']
-            
-            # Add formats
-            header_format = workbook.add_format({
-                'bold': True,
-                'text_wrap': True,
-                'valign': 'top',
-                'fg_color': '#D7E4BC',
-                'border': 1
-            })
-            
-            # Write the column headers with the defined format
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                worksheet.set_column(col_num, col_num, 15)
-            
-            # Create a chart
-            chart = workbook.add_chart({'type': 'column'})
-            
-            # Configure the series
-            chart.add_series({
-                'name': 'Monthly Revenue',
-                'categories': ['Monthly Revenue', 1, 0, 12, 0],
-                'values': ['Monthly Revenue', 1, 2, 12, 2],
-            })
-            
-            # Configure chart title
-            chart.set_title({'name': f'Revenue Report {year}'})
-            chart.set_x_axis({'name': 'Month'})
-            chart.set_y_axis({'name': 'Revenue (PHP)'})
-            
-            # Insert the chart into the worksheet
-            worksheet.insert_chart('F2', chart, {'x_offset': 25, 'y_offset': 10})
-            
-            # Close the Pandas Excel writer
-            writer.close()
+            with span('report.render', **{'report.format': 'xlsx'}):
+                # Write the DataFrame to the Excel file
+                df.to_excel(writer, sheet_name='Monthly Revenue', index=False)
+            
+                # Access the XlsxWriter workbook and worksheet objects
+                workbook = writer.book
+                worksheet = writer.sheets['Monthly Revenue']
+            
+                # Add formats
+                header_format = workbook.add_format({
+                    'bold': True,
+                    'text_wrap': True,
+                    'valign': 'top',
+                    'fg_color': '#D7E4BC',
+                    'border': 1
+                })
+            
+                # Write the column headers with the defined format
+                for col_num, value in enumerate(df.columns.values):
+                    worksheet.write(0, col_num, value, header_format)
+                    worksheet.set_column(col_num, col_num, 15)
+            
+                # Create a chart
+                chart = workbook.add_chart({'type': 'column'})
+            
+                # Configure the series
+                chart.add_series({
+                    'name': 'Monthly Revenue',
+                    'categories': ['Monthly Revenue', 1, 0, 12, 0],
+                    'values': ['Monthly Revenue', 1, 2, 12, 2],
+                })
+            
+                # Configure chart title
+                chart.set_title({'name': f'Revenue Report {year}'})
+                chart.set_x_axis({'name': 'Month'})
+                chart.set_y_axis({'name': 'Revenue (PHP)'})
+            
+                # Insert the chart into the worksheet
+                worksheet.insert_chart('F2', chart, {'x_offset': 25, 'y_offset': 10})
+            
+                # Close the Pandas Excel writer
+                writer.close()
             
             # Prepare response
             output.seek(0)
@@ -746,18 +922,21 @@ class RevenueReportView(APIView):
             elements.append(table)
             
             # Create a chart for visualization
-            plt.figure(figsize=(8, 4))
-            plt.bar(df['Month'], df['Total Revenue'])
-            plt.title(f'Monthly Revenue {year}')
-            plt.xlabel('Month')
-            plt.ylabel('Revenue (PHP)')
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            
-            # Save the chart to a buffer
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png')
-            img_buffer.seek(0)
+            with span('report.chart'):
+                plt.figure(figsize=(8, 4))
+                plt.bar(df['Month'], df['Total Revenue'])
+                plt.title(f'Monthly Revenue {year}')
+                plt.xlabel('Month')
+                plt.ylabel('Revenue (PHP)')
+                plt.xticks(rotation=45)
+                plt.tight_layout()
+            
+                # Save the chart to a buffer
+                img_buffer = io.BytesIO()
+                plt.savefig(img_buffer, format='png')
+                # Free the figure; pyplot keeps every open one alive
+                plt.close()
+                img_buffer.seek(0)
             
             # Add the chart to the PDF
             elements.append(Spacer(1, 20))
@@ -768,7 +947,8 @@ class RevenueReportView(APIView):
             elements.append(img)
             
             # Build PDF
-            doc.build(elements)
+            with span('report.render', **{'report.format': 'pdf'}):
+                doc.build(elements)
             buffer.seek(0)
             
             # Create response
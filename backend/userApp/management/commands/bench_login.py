@@ -0,0 +1,78 @@
+import time
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from userApp.serializers import RoleTokenObtainPairSerializer
+from userApp.tokens import RoleRefreshToken
+
+User = get_user_model()
+
+
+def legacy_login(credentials):
+    """The previous login flow: authenticate, look the user up again, decode and re-encode"""
+    serializer = TokenObtainPairSerializer(data=credentials)
+    serializer.is_valid(raise_exception=True)
+    user = User.objects.get(username=credentials['username'])
+    payload = jwt.decode(serializer.validated_data['access'], settings.SECRET_KEY, algorithms=['HS256'])
+    payload['role'] = user.role
+    payload['username'] = user.username
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def role_login(credentials):
+    serializer = RoleTokenObtainPairSerializer(data=credentials)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['access']
+
+
+def legacy_refresh(refresh_token):
+    token = RefreshToken(refresh_token)
+    payload = jwt.decode(str(token.access_token), settings.SECRET_KEY, algorithms=['HS256'])
+    user = User.objects.get(id=payload['user_id'])
+    payload['role'] = user.role
+    payload['username'] = user.username
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def role_refresh(refresh_token):
+    token = RoleRefreshToken(refresh_token)
+    user = User.objects.only('id', 'role', 'username').get(id=token['user_id'])
+    return str(token.access_token_for(user))
+
+
+class Command(BaseCommand):
+    help = 'Compare queries and time of the legacy and role-claim login/refresh paths for an existing account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('password')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        credentials = {'username': options['username'], 'password': options['password']}
+        if not User.objects.filter(username=credentials['username']).exists():
+            raise CommandError(f"User {credentials['username']} does not exist")
+        refresh_token = str(RoleRefreshToken.for_user(User.objects.get(username=credentials['username'])))
+
+        cases = [
+            ('login   legacy', legacy_login, credentials),
+            ('login   role  ', role_login, credentials),
+            ('refresh legacy', legacy_refresh, refresh_token),
+            ('refresh role  ', role_refresh, refresh_token),
+        ]
+        for label, func, arg in cases:
+            with CaptureQueriesContext(connection) as queries:
+                func(arg)
+            start = time.perf_counter()
+            for _ in range(options['iterations']):
+                func(arg)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / options['iterations']
+            self.stdout.write(f'{label}  queries={len(queries.captured_queries)}  {elapsed_ms:.3f} ms/op')
+        self.stdout.write('Login time is dominated by password hashing, which both paths share.')
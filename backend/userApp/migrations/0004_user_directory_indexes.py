@@ -0,0 +1,41 @@
+# Indexes for the paginated admin user directory.
+#
+# Prefix search lowercases the column, so on PostgreSQL it needs expression
+# indexes with text_pattern_ops for LIKE 'term%' to use them. SQLite (dev)
+# has no operator classes and gets no search indexes.
+
+from django.db import migrations, models
+
+SEARCH_FIELDS = ['username', 'email', 'first_name', 'last_name']
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "user_{field}_lower_prefix_idx" '
+            f'ON "userApp_user" ((LOWER("{field}")) text_pattern_ops)'
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "user_{field}_lower_prefix_idx"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userApp', '0003_alter_user_managers_user_is_paid_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
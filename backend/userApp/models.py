@@ -20,10 +20,19 @@ class User(AbstractUser):
     )
     delivery_address = models.TextField(null=True, blank=True)
     reset_code = models.CharField(max_length=6, null=True, blank=True)
+    reset_code_sent_at = models.DateTimeField(null=True, blank=True)  # When reset_code was issued; codes expire after RESET_CODE_TTL_MINUTES
+    is_paid = models.BooleanField(default=False)
+    profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
 
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin user directory: role filter sorted by join date
+            models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+        ]
+
 # Serializer for the User model
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
@@ -1,9 +1,15 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from .models import User
+from .tokens import RoleRefreshToken
+from utils.fast_serializers import FastReadSerializer
 from django.conf import settings
 import boto3
+import logging
 from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -24,8 +30,8 @@ class UserSerializer(serializers.ModelSerializer):
             response = s3_client.generate_presigned_url('put_object',
                                                         Params={'Bucket': bucket_name, 'Key': object_name},
                                                         ExpiresIn=expiration)
-        except ClientError as e:
-            print(e)
+        except ClientError:
+            logger.exception('Could not create presigned URL for %s', object_name)
             return None
         return response
 
@@ -52,8 +58,8 @@ class UserSerializer(serializers.ModelSerializer):
                 try:
                     s3_client.put_object(Bucket=bucket_name, Key=object_name, Body=profile_picture)
                     instance.profile_picture = object_name
-                except ClientError as e:
-                    print(e)
+                except ClientError:
+                    logger.exception('Profile picture upload to %s failed', object_name)
                     raise serializers.ValidationError({"profile_picture": "Failed to upload image to S3."})
 
         instance.save()
@@ -87,9 +93,21 @@ class UserSerializer(serializers.ModelSerializer):
                 try:
                     s3_client.put_object(Bucket=bucket_name, Key=object_name, Body=profile_picture)
                     instance.profile_picture = object_name
-                except ClientError as e:
-                    print(e)
+                except ClientError:
+                    logger.exception('Profile picture upload to %s failed', object_name)
                     raise serializers.ValidationError({"profile_picture": "Failed to upload image to S3."})
 
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login serializer whose tokens carry role/username claims from the authenticated user"""
+    token_class = RoleRefreshToken
+
+
+class UserReadSerializer(FastReadSerializer):
+    """Fast path for the user list; same output as UserSerializer"""
+    class Meta:
+        model = User
+        fields = ['id', 'first_name', 'last_name', 'email', 'username', 'role', 'date_joined', 'delivery_address']
@@ -1,3 +1,140 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from utils.testing import api_client
+from utils.throttling import LoginThrottle
+
+from .models import User
+
+
+class UserTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+
+
+class UserDirectoryTests(UserTestCase):
+    def test_admins_search_by_prefix_and_page_without_counting(self):
+        for number in range(3):
+            User.objects.create_user(f'juan{number}', f'juan{number}@example.com', 'pw')
+        response = api_client(self.admin).get('/api/users/directory/', {'search': 'JUAN', 'page_size': 2, 'sort': 'username'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['username'] for row in data['results']], ['juan0', 'juan1'])
+        self.assertTrue(data['has_next'])
+        self.assertIsNone(data['count'])
+
+    def test_customers_are_refused(self):
+        self.assertEqual(api_client(self.customer).get('/api/users/directory/').status_code, 403)
+
+    def test_user_count_is_admin_only(self):
+        self.assertEqual(APIClient().get('/api/users/count/').status_code, 401)
+        self.assertEqual(api_client(self.customer).get('/api/users/count/').status_code, 403)
+        response = api_client(self.admin).get('/api/users/count/')
+        self.assertEqual((response.status_code, response.json()), (200, {'count': 2}))
+
+    def test_user_keeps_the_abstract_user_meta_options(self):
+        self.assertEqual(User._meta.verbose_name_plural, 'users')
+
+
+class LoginTests(UserTestCase):
+    def claims(self, token):
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+
+    def test_login_reads_the_user_once_and_mints_role_claims(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post('/api/login/', {'username': 'admin', 'password': 'pw'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['redirect_url'], '/AdminPage/AdminHome')
+        claims = self.claims(response.cookies['jwt_access_token'].value)
+        self.assertEqual((claims['username'], claims['role']), ('admin', 'admin'))
+        user_reads = [query for query in queries.captured_queries
+                      if query['sql'].startswith('SELECT') and User._meta.db_table in query['sql']]
+        self.assertEqual(len(user_reads), 1)
+
+    def test_wrong_passwords_are_refused(self):
+        response = APIClient().post('/api/login/', {'username': 'admin', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('jwt_access_token', response.cookies)
+
+    def test_refreshed_access_tokens_carry_the_current_role(self):
+        client = APIClient()
+        client.post('/api/login/', {'username': 'customer', 'password': 'pw'}, format='json')
+        User.objects.filter(pk=self.customer.pk).update(role='admin')
+
+        response = client.post('/api/token/refresh/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.claims(response.json()['access'])['role'], 'admin')
+
+
+@override_settings(AUTH_THROTTLE_RATES={'login': {'ip': '100/m', 'account': '3/m'}})
+class LoginThrottleTests(UserTestCase):
+    def login(self, username='admin'):
+        return APIClient().post('/api/login/', {'username': username, 'password': 'wrong'}, format='json')
+
+    def test_each_account_gets_its_own_budget(self):
+        with mock.patch.object(LoginThrottle, 'timer', mock.Mock(return_value=6000)):
+            self.assertEqual([self.login().status_code for _ in range(3)], [400] * 3)
+            refused = self.login()
+            self.assertEqual(refused.status_code, 429)
+            self.assertGreater(int(refused['Retry-After']), 0)
+            self.assertEqual(self.login('customer').status_code, 400)
+
+    def test_the_previous_window_counts_by_how_much_it_still_overlaps(self):
+        clock = mock.Mock(return_value=6000)
+        with mock.patch.object(LoginThrottle, 'timer', clock):
+            for _ in range(3):
+                self.login()
+            clock.return_value = 6061  # previous window still weighs 59/60 of 3
+            self.assertEqual(self.login().status_code, 429)
+            clock.return_value = 6090  # half of it: 1.5 + 1 fits in 3
+            self.assertEqual(self.login().status_code, 400)
+
+    @override_settings(AUTH_THROTTLE_RATES={'login': {'ip': '2/m'}})
+    def test_clients_cannot_pick_their_own_ip(self):
+        with mock.patch.object(LoginThrottle, 'timer', mock.Mock(return_value=6000)):
+            statuses = [
+                APIClient().post('/api/login/', {'username': 'admin', 'password': 'wrong'}, format='json',
+                                 HTTP_X_FORWARDED_FOR=f'10.0.0.{number}').status_code
+                for number in range(3)
+            ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_a_concurrent_burst_cannot_exceed_the_budget(self):
+        burst = 8
+        # Every request reaches the counter before any of them moves it
+        barrier = threading.Barrier(burst, timeout=5)
+        real_add = LocMemCache.add
+
+        def add_together(cache, *args, **kwargs):
+            barrier.wait()
+            return real_add(cache, *args, **kwargs)
+
+        def attempt():
+            request = Request(APIRequestFactory().post('/api/login/', {'username': 'admin'}, format='json'),
+                              parsers=[JSONParser()])
+            allowed.append(LoginThrottle().allow_request(request, None))
+
+        allowed = []
+        with mock.patch.object(LoginThrottle, 'timer', mock.Mock(return_value=6000)), \
+                mock.patch.object(LocMemCache, 'add', autospec=True, side_effect=add_together):
+            threads = [threading.Thread(target=attempt) for _ in range(burst)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(allowed.count(True), 3)
@@ -0,0 +1,23 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def add_role_claims(token, user):
+    """The claims views read from the jwt_access_token cookie"""
+    token['role'] = user.role
+    token['username'] = user.username
+    return token
+
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token minted with the user's role and username. Access tokens made
+    from it copy these claims, so they are signed once with the claims already in.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return add_role_claims(super().for_user(user), user)
+
+    def access_token_for(self, user):
+        """Access token with claims refreshed from `user` (role may have changed since login)"""
+        return add_role_claims(self.access_token, user)
@@ -7,6 +7,8 @@ from .views import (
     LogoutView,
     UserProfileView,
     UpdateAllUsersView,
+    UserDirectoryView,
+    get_user_count,
     FetchDecodedTokenView,
     CustomTokenObtainPairView,
     CustomTokenRefreshView,
@@ -24,6 +26,8 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('payment/', UserPaymentView.as_view(), name='user-payment'),
     path('users/', UpdateAllUsersView.as_view(), name='update-all-users'),
+    path('users/directory/', UserDirectoryView.as_view(), name='user-directory'),
+    path('users/count/', get_user_count, name='user-count'),
     path('fetchdecodedtoken/', FetchDecodedTokenView.as_view(), name='fetch-decoded-token'),
     path('send_reset_code/', SendResetCodeView.as_view(), name='send_reset_code'),
     path('verify_reset_code/', VerifyResetCodeView.as_view(), name='verify_reset_code'),
@@ -4,24 +4,67 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .models import User
-from .serializers import UserSerializer
+from .serializers import UserSerializer, UserReadSerializer, RoleTokenObtainPairSerializer
+from .tokens import RoleRefreshToken
 import datetime
 import jwt
+import logging
 from rest_framework.exceptions import AuthenticationFailed 
 from rest_framework.permissions import IsAuthenticated
 from django.core.mail import send_mail
 from django.conf import settings
 import random
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from utils.fast_serializers import InvalidFieldsError, sparse_fieldset
+from utils.email_utils import queue_html_email
+from utils.throttling import LoginThrottle, RegisterThrottle, ResetCodeSendThrottle, ResetCodeVerifyThrottle
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+USER_COUNT_CACHE_KEY = 'users:count'
+USER_COUNT_CACHE_SECONDS = 300
+# Below this many rows an exact COUNT(*) is cheap enough
+EXACT_USER_COUNT_LIMIT = 10000
+
+DIRECTORY_SEARCH_FIELDS = ['username', 'email', 'first_name', 'last_name']
+DIRECTORY_SORT_FIELDS = {'username', 'email', 'first_name', 'last_name', 'date_joined', 'role'}
+DIRECTORY_MAX_PAGE_SIZE = 100
+
+
+def approximate_user_count():
+    """User count cached for a few minutes; large PostgreSQL tables use planner statistics"""
+    count = cache.get(USER_COUNT_CACHE_KEY)
+    if count is not None:
+        return count
+
+    count = None
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [User._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > EXACT_USER_COUNT_LIMIT:
+            count = row[0]
+    if count is None:
+        count = User.objects.count()
+    cache.set(USER_COUNT_CACHE_KEY, count, USER_COUNT_CACHE_SECONDS)
+    return count
+
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def get_user_count(request):
+    if request.user.role != 'admin':
+        return Response({'message': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
     try:
-        count = User.objects.count()
+        count = approximate_user_count()
         return Response({'count': count})
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -36,11 +79,13 @@ class UserPaymentView(APIView):
         return Response({'message': 'Payment successful'}, status=status.HTTP_200_OK)
 
 class UserRegisterView(APIView):
+    throttle_classes = [RegisterThrottle]
+
     def post(self, request, format=None):
         serializer = UserSerializer(data=request.data)  # Use the serializer to validate and save user data
         if serializer.is_valid():
             user = serializer.save()  # Save the new user
-            print(user)
+            logger.info('User registered', extra={'user_id': user.id})
             return Response({
                 "user": serializer.data,
                 "message": "User registered successfully."
@@ -83,6 +128,8 @@ class UserProfileView(APIView):
 
 
 class SendResetCodeView(APIView):
+    throttle_classes = [ResetCodeSendThrottle]
+
     def post(self, request, format=None):
         email = request.data.get('email')
         if not email:
@@ -95,6 +142,7 @@ class SendResetCodeView(APIView):
         
         reset_code = random.randint(1000, 9999)
         user.reset_code = reset_code
+        user.reset_code_sent_at = timezone.now()
         user.save()
         
         # First send plain text email as fallback
@@ -108,7 +156,7 @@ class SendResetCodeView(APIView):
         
         # Then try to send HTML email
         try:
-            send_html_email(
+            queue_html_email(
                 'Password Reset Code - Winch Point Offroad House',
                 'emails/password_reset.html',
                 email,
@@ -117,12 +165,14 @@ class SendResetCodeView(APIView):
                 }
             )
         except Exception as e:
-            print(f"HTML email could not be sent: {e}")
+            logger.warning('Password reset HTML email could not be queued: %s', e)
             # Regular email already sent as fallback
         
         return Response({'message': 'Reset code sent to email'}, status=status.HTTP_200_OK)
 
 class VerifyResetCodeView(APIView):
+    throttle_classes = [ResetCodeVerifyThrottle]
+
     def post(self, request, format=None):
         email = request.data.get('email')
         reset_code = request.data.get('reset_code')
@@ -131,7 +181,11 @@ class VerifyResetCodeView(APIView):
             return Response({'message': 'Email and reset code are required'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            user = User.objects.get(email=email, reset_code=reset_code)
+            user = User.objects.get(
+                email=email,
+                reset_code=reset_code,
+                reset_code_sent_at__gte=timezone.now() - datetime.timedelta(minutes=settings.RESET_CODE_TTL_MINUTES),
+            )
         except User.DoesNotExist:
             return Response({'message': 'Invalid reset code'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -152,6 +206,7 @@ class ResetPasswordView(APIView):
         
         user.set_password(new_password)
         user.reset_code = None
+        user.reset_code_sent_at = None
         user.save()
         
         return Response({'message': 'Password reset successful'}, status=status.HTTP_200_OK)
@@ -160,7 +215,10 @@ class UpdateAllUsersView(APIView):
     # permission_classes = [IsAuthenticated]
     def get(self, request, format=None):
         users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
+        try:
+            serializer = UserReadSerializer(users, **sparse_fieldset(request))
+        except InvalidFieldsError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.data)
 
 
@@ -201,6 +259,65 @@ class UpdateAllUsersView(APIView):
         user.delete()
         return Response({'message': 'User deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
+class UserDirectoryView(APIView):
+    """
+    Paginated admin user listing.
+    Query params: search (prefix of username/email/name), role, sort (e.g. -date_joined),
+    page, page_size, fields / exclude.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        if request.user.role != 'admin':
+            return Response({'message': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 25)), 1), DIRECTORY_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'message': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        sort = request.query_params.get('sort', '-date_joined')
+        if sort.lstrip('-') not in DIRECTORY_SORT_FIELDS:
+            return Response({'message': f'Invalid sort field: {sort}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        users = User.objects.all()
+        filtered = False
+
+        role = request.query_params.get('role')
+        if role:
+            users = users.filter(role=role)
+            filtered = True
+
+        search = request.query_params.get('search', '').strip().lower()
+        if search:
+            # Lowercased prefix match, backed by the text_pattern_ops indexes on PostgreSQL
+            users = users.annotate(**{
+                f'{field}_lower': Lower(field) for field in DIRECTORY_SEARCH_FIELDS
+            })
+            condition = Q()
+            for field in DIRECTORY_SEARCH_FIELDS:
+                condition |= Q(**{f'{field}_lower__startswith': search})
+            users = users.filter(condition)
+            filtered = True
+
+        # Fetch one extra row to know whether there is a next page without a COUNT(*)
+        offset = (page - 1) * page_size
+        try:
+            rows = UserReadSerializer(users.order_by(sort, 'id')[offset:offset + page_size + 1], **sparse_fieldset(request)).data
+        except InvalidFieldsError as e:
+            return Response({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'results': rows[:page_size],
+            'page': page,
+            'page_size': page_size,
+            'has_next': len(rows) > page_size,
+            # Only the unfiltered total is kept cached; filtered totals are not counted
+            'count': None if filtered else approximate_user_count(),
+        })
+
+
 class FetchDecodedTokenView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, format=None):
@@ -220,47 +337,34 @@ class FetchDecodedTokenView(APIView):
 
 # JWT token views
 class CustomTokenObtainPairView(TokenObtainPairView):
+   serializer_class = RoleTokenObtainPairSerializer
+   throttle_classes = [LoginThrottle]
+
    def post(self, request, *args, **kwargs):
         try:
-            response = super().post(request, *args, **kwargs)
-            print(response.data)
-
-            if 'access' in response.data:
-                access_token = response.data['access']
-                refresh_token = response.data['refresh']
-
-                # Get user and role
-                user = User.objects.get(username=request.data['username'])
-                if not user:
-                    raise AuthenticationFailed('User not found')
-
-                payload = jwt.decode(access_token, settings.SECRET_KEY, algorithms=['HS256'])
-
-                # Add user role and username to the payload
-                payload['role'] = user.role
-                payload['username'] = user.username
-
-                # Encode new token with the additional info
-                new_access_token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
-
-                # Set cookies in response
-                response.set_cookie(key='jwt_access_token', value=new_access_token, httponly=True, samesite='none', secure=True)
-                response.set_cookie(key='jwt_refresh_token', value=refresh_token, httponly=True, samesite='none', secure=True)
+            # Authenticates with a single user query and mints tokens that
+            # already carry the role/username claims
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            user = serializer.user
+            response = Response(serializer.validated_data, status=status.HTTP_200_OK)
+            logger.info('User logged in', extra={'user_id': user.id})
+
+            access_token = response.data['access']
+            refresh_token = response.data['refresh']
+
+            # Set cookies in response
+            response.set_cookie(key='jwt_access_token', value=access_token, httponly=True, samesite='none', secure=True)
+            response.set_cookie(key='jwt_refresh_token', value=refresh_token, httponly=True, samesite='none', secure=True)
                 
-                # Add redirect URL based on user role
-                if user.role == 'admin':
-                    response.data['redirect_url'] = '/AdminPage/AdminHome'
-                else:
-                    response.data['redirect_url'] = '/'
+            # Add redirect URL based on user role
+            if user.role == 'admin':
+                response.data['redirect_url'] = '/AdminPage/AdminHome'
+            else:
+                response.data['redirect_url'] = '/'
 
             return response
 
-        except User.DoesNotExist:
-            return Response({'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
-        except jwt.ExpiredSignatureError:
-            return Response({'message': 'Token has expired'}, status=status.HTTP_401_UNAUTHORIZED)
-        except jwt.InvalidTokenError:
-            return Response({'message': 'Invalid token'}, status=status.HTTP_401_UNAUTHORIZED)
         except AuthenticationFailed as e:
             return Response({'message': 'Invalid username or password!'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -273,26 +377,11 @@ class CustomTokenRefreshView(TokenRefreshView):
             return Response({'error': 'Refresh token not found'}, status=400)
 
         try:
-            # Decode the refresh token to access the user info
-            token = RefreshToken(refresh_token)
-            access_token = token.access_token
-
-            # Decode the access token to modify the payload
-            payload = jwt.decode(str(access_token), settings.SECRET_KEY, algorithms=['HS256'])
-
-            # Get the user associated with the refresh token
-            user = User.objects.get(id=payload['user_id'])
-
-            # Add user role and username to the payload
-            payload['role'] = user.role
-            payload['username'] = user.username
-
-            # Encode the new access token with the updated payload
-            new_access_token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
-
-            # If new_access_token is in bytes, decode it to a string
-            if isinstance(new_access_token, bytes):
-                new_access_token = new_access_token.decode('utf-8')
+            # Verify the refresh token, then mint the access token with fresh
+            # role/username claims in a single signing step
+            token = RoleRefreshToken(refresh_token)
+            user = User.objects.only('id', 'role', 'username').get(id=token['user_id'])
+            new_access_token = str(token.access_token_for(user))
 
             # Return the new access token in the response and set it as a cookie
             response = Response({'access': new_access_token}, status=200)
@@ -0,0 +1,35 @@
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .db_router import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background')
+
+
+def _run(func, args, kwargs):
+    try:
+        # Tasks read rows their request just wrote; never from a lagging replica
+        with pin_to_primary():
+            func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        # Each worker thread has its own connection; don't leave it open
+        connection.close()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Run `func` on a worker thread once the current transaction commits, so
+    the request returns without waiting for it (and the task sees committed rows).
+    """
+    # The task runs in a copy of the caller's context, so its log lines keep
+    # the request's correlation id
+    context = contextvars.copy_context()
+    transaction.on_commit(lambda: _executor.submit(context.run, _run, func, args, kwargs))
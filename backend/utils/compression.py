@@ -0,0 +1,86 @@
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml')
+
+
+def available_encodings():
+    """Supported encodings, most preferred first"""
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def compress(body, encoding, best=False):
+    """Compress `body`; `best` trades CPU for size (for bodies compressed once and cached)"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else 4)
+    return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+
+
+def precompress(body):
+    """Every encoding of `body` worth storing next to it in a cache entry"""
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return {}
+    return {encoding: compress(body, encoding, best=True) for encoding in available_encodings()}
+
+
+def negotiate_encoding(request):
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+        if not part.strip().endswith(';q=0')
+    }
+    for encoding in available_encodings():
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip compression for responses above COMPRESSION_MIN_SIZE.
+
+    Views can attach already compressed bodies as `response.precompressed`
+    ({'gzip': bytes, 'br': bytes}); those are sent as-is instead of being
+    compressed again on every request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if (
+            response.streaming
+            or response.status_code != 200
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+
+        precompressed = getattr(response, 'precompressed', None) or {}
+        if not precompressed and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            return response
+
+        body = precompressed.get(encoding)
+        if body is None:
+            body = compress(response.content, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        return response
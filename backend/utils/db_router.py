@@ -0,0 +1,124 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+# Set while a block of code should read from a replica regardless of model
+# (e.g. report aggregations), or must read from the primary (read-your-writes).
+_force_replica = ContextVar('force_replica', default=False)
+_pin_primary = ContextVar('pin_primary', default=False)
+# Set by ReplicaStickinessMiddleware while a web request is handled. Replicas
+# are only read from inside one: management commands and background tasks
+# read back what they just wrote, so they always use the primary.
+_in_web_request = ContextVar('in_web_request', default=False)
+
+# Apps whose reads are safe to serve from a replica
+REPLICA_READ_APPS = {'inventoryApp'}
+
+STICKY_COOKIE_NAME = 'db_pin_primary'
+
+
+def get_replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def replica_allowed():
+    """
+    Whether reads may go to a replica right now: inside an unpinned web
+    request, and not inside a transaction on the primary (whose uncommitted
+    writes a replica can't see)
+    """
+    return _in_web_request.get() and not _pin_primary.get() and not connections['default'].in_atomic_block
+
+
+def choose_replica():
+    """Return a replica alias, or the primary if no replicas are configured or reads are pinned"""
+    replicas = get_replica_aliases()
+    if not replicas or not replica_allowed():
+        return 'default'
+    return random.choice(replicas)
+
+
+@contextmanager
+def read_from_replica():
+    """Route every read inside the block to a replica (used by reports)"""
+    token = _force_replica.set(True)
+    try:
+        yield
+    finally:
+        _force_replica.reset(token)
+
+
+@contextmanager
+def pin_to_primary():
+    """Route every read inside the block to the primary database"""
+    token = _pin_primary.set(True)
+    try:
+        yield
+    finally:
+        _pin_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send catalog reads and report queries made by web requests to a
+    replica, everything else (and every write) to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not replica_allowed():
+            return 'default'
+        if _force_replica.get() or model._meta.app_label in REPLICA_READ_APPS:
+            return choose_replica()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # All aliases hold the same data, so relations across them are fine
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from replication in production; locally
+        # each SQLite replica file is migrated with --database=<alias>.
+        return True
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Read-your-writes: after a successful mutating request (checkout, cart
+    changes, admin edits), pin that client's reads to the primary for
+    DATABASE_REPLICA_STICKY_SECONDS so replication lag is never visible.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replica_aliases():
+            return self.get_response(request)
+
+        # Mutating requests always read from the primary too, so stock checks
+        # and cart lookups never act on stale rows.
+        mutating = request.method not in ('GET', 'HEAD', 'OPTIONS')
+        sticky = STICKY_COOKIE_NAME in request.COOKIES
+        request_token = _in_web_request.set(True)
+        token = _pin_primary.set(sticky or mutating)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin_primary.reset(token)
+            _in_web_request.reset(request_token)
+
+        if mutating and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE_NAME,
+                '1',
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='none',
+                secure=True,
+            )
+        return response
@@ -1,45 +1,83 @@
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+import logging
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
+from django.template.loader import render_to_string
+
+from utils.background import run_in_background
+from utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def build_html_email(subject, template_name, to_email, context):
+    """Render a template into an email message, without sending it"""
+    # Add site URL to context for links
+    if 'site_url' not in context:
+        context['site_url'] = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:3000'
+    
+    # Render HTML content; the cached template loader keeps the compiled
+    # template and base_email.html in memory after the first email
+    with span('email.render', **{'email.template': template_name}):
+        html_content = render_to_string(template_name, context)
+    
+    # Create a more descriptive plain text version
+    plain_text = f"This email contains HTML content. Please use an HTML-compatible email client to view it properly.\n\n"
+    if 'customer_name' in context:
+        plain_text += f"Hello {context['customer_name']},\n\n"
+    if 'order_id' in context:
+        plain_text += f"Regarding your order #{context['order_id']}.\n\n"
+    if 'reset_code' in context:
+        plain_text += f"Your password reset code is: {context['reset_code']}\n\n"
+    
+    plain_text += "Thank you for choosing Winch Point Offroad House."
+    
+    # Create email with multiple parts
+    email = EmailMultiAlternatives(
+        subject,
+        plain_text,
+        f"Winch Point Offroad House <{settings.EMAIL_HOST_USER}>",  # Using a better from address
+        [to_email]
+    )
+    
+    # Attach HTML content with proper MIME type
+    email.attach_alternative(html_content, "text/html")
+    
+    # Add email headers that help with HTML rendering
+    email.mixed_subtype = 'related'
+    return email
+
 
 def send_html_email(subject, template_name, to_email, context):
     """Send an HTML email using a template"""
     try:
-        # Add site URL to context for links
-        if 'site_url' not in context:
-            context['site_url'] = settings.SITE_URL if hasattr(settings, 'SITE_URL') else 'http://localhost:3000'
-        
-        # Render HTML content
-        html_content = render_to_string(template_name, context)
-        
-        # Create a more descriptive plain text version
-        plain_text = f"This email contains HTML content. Please use an HTML-compatible email client to view it properly.\n\n"
-        if 'customer_name' in context:
-            plain_text += f"Hello {context['customer_name']},\n\n"
-        if 'order_id' in context:
-            plain_text += f"Regarding your order #{context['order_id']}.\n\n"
-        if 'reset_code' in context:
-            plain_text += f"Your password reset code is: {context['reset_code']}\n\n"
-        
-        plain_text += "Thank you for choosing Winch Point Offroad House."
-        
-        # Create email with multiple parts
-        email = EmailMultiAlternatives(
-            subject,
-            plain_text,
-            f"Winch Point Offroad House <{settings.EMAIL_HOST_USER}>",  # Using a better from address
-            [to_email]
-        )
-        
-        # Attach HTML content with proper MIME type
-        email.attach_alternative(html_content, "text/html")
-        
-        # Add email headers that help with HTML rendering
-        email.mixed_subtype = 'related'
-        
-        # Send email
-        return email.send()
-    except Exception as e:
-        print(f"HTML email error for template {template_name}: {e}")
+        email = build_html_email(subject, template_name, to_email, context)
+        with span('smtp.send', **{'email.messages': 1}):
+            return email.send()
+    except Exception:
+        logger.exception('HTML email error for template %s', template_name)
         # Return False instead of raising the exception
-        return False
\ No newline at end of file
+        return False
+
+
+def queue_html_email(subject, template_name, to_email, context):
+    """Render and send an HTML email on a background worker once the transaction commits"""
+    run_in_background(send_html_email, subject, template_name, to_email, context)
+
+
+def send_bulk_emails(messages):
+    """Send prepared messages one by one over a single SMTP connection; returns the ones that went out"""
+    delivered = []
+    if not messages:
+        return delivered
+    try:
+        with span('smtp.send', **{'email.messages': len(messages)}), get_connection() as connection:
+            for message in messages:
+                try:
+                    if connection.send_messages([message]):
+                        delivered.append(message)
+                except Exception:
+                    logger.exception('Email to %s failed', ', '.join(message.to))
+    except Exception:
+        logger.exception('Bulk email error (%d messages)', len(messages))
+    return delivered
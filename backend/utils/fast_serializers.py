@@ -0,0 +1,144 @@
+import decimal
+
+from django.db import models
+from django.utils import timezone
+
+
+def _decimal_converter(field):
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.Context(prec=field.max_digits)
+
+    def convert(value):
+        if value is None:
+            return None
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value))
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return convert
+
+
+def _datetime_converter(field):
+    def convert(value):
+        if value is None:
+            return None
+        value = timezone.localtime(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def _file_converter(field):
+    def convert(value):
+        return field.storage.url(value) if value else None
+    return convert
+
+
+def converter_for(field):
+    """Match the output of the ModelSerializer field DRF would build for `field`"""
+    if isinstance(field, models.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, models.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, models.FileField):
+        return _file_converter(field)
+    return None
+
+
+def resolve_field(model, lookup):
+    """Model field a values() lookup such as "product__price" ends on"""
+    *path, name = lookup.split('__')
+    for part in path:
+        model = model._meta.get_field(part).related_model
+    return model._meta.get_field(name)
+
+
+class InvalidFieldsError(ValueError):
+    pass
+
+
+def sparse_fieldset(request):
+    """`?fields=` / `?exclude=` query params as keyword arguments for FastReadSerializer"""
+    def parse(name):
+        value = request.query_params.get(name)
+        return [part.strip() for part in value.split(',') if part.strip()] if value else None
+    return {'fields': parse('fields'), 'exclude': parse('exclude')}
+
+
+class FastReadSerializer:
+    """
+    Read-only list serializer over `.values()` rows for hot list endpoints.
+
+    Produces the same JSON as the matching ModelSerializer without building
+    model instances or per-field serializer objects. Subclasses declare:
+
+        class Meta:
+            model = Product
+            fields = ['productID', 'category', 'name', ...]
+            # output name -> values() lookup; dotted names build nested objects
+            sources = {'category': 'category__name', 'product.name': 'product__name'}
+
+    `fields` / `exclude` narrow the output (and the SELECT) to a subset; a
+    nested object can be picked as a whole ("product") or per key ("product.name").
+    """
+
+    def __init__(self, queryset, fields=None, exclude=None):
+        self.queryset = queryset
+        self.plan = self._select(self._plan(), fields, exclude)
+
+    @classmethod
+    def _plan(cls):
+        # Built once per serializer class: (output path, values() lookup, converter)
+        if '_plan_cache' not in cls.__dict__:
+            meta = cls.Meta
+            sources = getattr(meta, 'sources', {})
+            plan = []
+            for name in meta.fields:
+                lookup = sources.get(name, name.replace('.', '__'))
+                field = resolve_field(meta.model, lookup)
+                if field.is_relation and lookup == name:
+                    # A bare foreign key renders as its raw key value
+                    lookup = field.attname
+                plan.append((name.split('.'), lookup, converter_for(field)))
+            cls._plan_cache = plan
+        return cls._plan_cache
+
+    @staticmethod
+    def _select(plan, fields, exclude):
+        if not fields and not exclude:
+            return plan
+
+        known = set()
+        for path, _, _ in plan:
+            known.update('.'.join(path[:depth]) for depth in range(1, len(path) + 1))
+        unknown = [name for name in (fields or []) + (exclude or []) if name not in known]
+        if unknown:
+            raise InvalidFieldsError(f"Unknown field(s): {', '.join(unknown)}")
+
+        def matches(path, names):
+            return any('.'.join(path[:depth]) in names for depth in range(1, len(path) + 1))
+
+        if fields:
+            plan = [entry for entry in plan if matches(entry[0], fields)]
+        if exclude:
+            plan = [entry for entry in plan if not matches(entry[0], exclude)]
+        if not plan:
+            raise InvalidFieldsError('No fields left to return')
+        return plan
+
+    @property
+    def data(self):
+        plan = self.plan
+        rows = self.queryset.values_list(*[lookup for _, lookup, _ in plan])
+        result = []
+        for row in rows:
+            item = {}
+            for (path, _, converter), value in zip(plan, row):
+                if converter:
+                    value = converter(value)
+                target = item
+                for key in path[:-1]:
+                    target = target.setdefault(key, {})
+                target[path[-1]] = value
+            result.append(item)
+        return result
@@ -0,0 +1,164 @@
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_RE = re.compile(r'^[\w.-]{1,64}$')
+
+# LogRecord attributes that are not `extra=` fields
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'correlation_id'}
+
+
+class CorrelationIdMiddleware:
+    """
+    Tag everything logged while handling a request with one id: the caller's
+    X-Request-ID when it sends a sane one, otherwise a new one. The id is
+    echoed back in the response header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = correlation_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            correlation_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep only a `rate` fraction of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields are included as keys"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class AsyncJSONHandler(QueueHandler):
+    """
+    Hand records to a bounded queue; a QueueListener thread formats them as
+    JSON and writes them to stderr. Request threads never wait on the
+    stream: when the queue is full the record is dropped and counted, and
+    the count is logged at most every `drop_report_seconds`.
+
+    The listener thread is started by the first record a process emits, so
+    importing settings (e.g. in a gunicorn master before it forks) starts
+    no thread, and each forked worker gets its own.
+    """
+
+    def __init__(self, queue_size=10000, drop_report_seconds=60):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.drop_report_seconds = drop_report_seconds
+        self.dropped = 0  # Since the last report
+        self._last_drop_report = time.monotonic()
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        self.stream = logging.StreamHandler(sys.stderr)
+        self.stream.setFormatter(JSONFormatter())
+        self.listener = None
+
+    def emit(self, record):
+        if self._listener_pid != os.getpid():
+            self._start_listener()
+        super().emit(record)
+
+    def _start_listener(self):
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                return
+            # After a fork the parent's listener thread did not come along
+            self.listener = QueueListener(self.queue, self.stream, respect_handler_level=False)
+            self.listener.start()
+            self._listener_pid = os.getpid()
+
+    def close(self):
+        # Called by logging.shutdown at exit: write out what is still queued
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                self.listener.stop()
+            self._listener_pid = None
+        super().close()
+
+    def prepare(self, record):
+        # Resolve everything that can't cross threads (args, tracebacks) here,
+        # but keep the record's fields instead of flattening it to a string
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped and time.monotonic() - self._last_drop_report >= self.drop_report_seconds:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        self._last_drop_report = time.monotonic()
+        try:
+            self.queue.put_nowait(logging.makeLogRecord({
+                'name': __name__,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': f'Dropped {dropped} log records: the log queue was full',
+                'dropped_records': dropped,
+                'correlation_id': None,
+            }))
+        except queue.Full:
+            self.dropped += dropped
@@ -0,0 +1,100 @@
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\S+)(.*)$')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\S+)')
+
+
+def call_site(skip=()):
+    """'path:line in function' of the innermost project frame that ran the query"""
+    root = str(settings.BASE_DIR)
+    skip = {__file__, *skip}
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename not in skip and 'site-packages' not in filename:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def explain(connection, sql, params):
+    """
+    The query's plan as a list of lines (EXPLAIN QUERY PLAN on SQLite,
+    EXPLAIN on PostgreSQL), or None for statements other than SELECT.
+    Runs on a raw cursor so it is not itself logged or traced.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if connection.vendor == 'sqlite':
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def full_scans(vendor, plan):
+    """Tables the plan reads row by row without an index"""
+    tables = []
+    for line in plan or []:
+        if vendor == 'sqlite':
+            match = SQLITE_SCAN_RE.match(line.strip())
+            if match and 'USING' not in match.group(2) and match.group(1) != 'CONSTANT':
+                tables.append(match.group(1))
+        else:
+            match = POSTGRES_SCAN_RE.search(line)
+            if match:
+                tables.append(match.group(1))
+    return tables
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper logging queries slower than SLOW_QUERY_MS with their plan"""
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - start) * 1000
+    if duration >= settings.SLOW_QUERY_MS and not many:
+        connection = context['connection']
+        try:
+            plan = explain(connection, sql, params)
+        except Exception as e:
+            plan = [f'EXPLAIN failed: {e}']
+        logger.warning('Slow query (%.1f ms) at %s', duration, call_site(), extra={
+            'duration_ms': round(duration, 1),
+            'database': connection.alias,
+            'sql': sql,
+            'params': params,
+            'plan': plan,
+            'full_scans': full_scans(connection.vendor, plan),
+        })
+    return result
+
+
+class SlowQueryLogMiddleware:
+    """Log slow queries made while handling a request (development only, see SLOW_QUERY_LOG)"""
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(log_slow_queries))
+            return self.get_response(request)
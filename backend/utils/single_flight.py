@@ -0,0 +1,102 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def cached_single_flight(key, compute, timeout, stale_key=None, stale_timeout=None):
+    """
+    cache.get(key), recomputing on a miss with dogpile protection.
+
+    Threads of one process that miss on the same key wait for a single
+    computation. Across processes a short cache lock (cache.add) elects one
+    recomputing worker; the others serve the last value stored under
+    `stale_key` (an unversioned key that survives invalidations) if there
+    is one, or else wait for the new value, taking the lock over if its
+    holder lets it expire. Nothing is computed without holding the lock.
+    The stale copy is kept for `stale_timeout` (default `timeout`);
+    TTL-expired caches want it longer.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    stale_timeout = stale_timeout or timeout
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        flight.done.wait(settings.SINGLE_FLIGHT_WAIT_SECONDS)
+        if flight.done.is_set() and flight.error is None:
+            return flight.value
+        # The leader failed or is taking too long; go through the shared lock
+        return _fetch(key, compute, timeout, stale_key, stale_timeout)
+
+    try:
+        flight.value = _fetch(key, compute, timeout, stale_key, stale_timeout)
+        return flight.value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _fetch(key, compute, timeout, stale_key, stale_timeout):
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, settings.SINGLE_FLIGHT_LOCK_SECONDS):
+        # Another process is recomputing
+        if stale_key is not None:
+            stale = cache.get(stale_key)
+            if stale is not None:
+                return stale
+        value = _wait_for_value_or_lock(key, lock_key)
+        if value is not None:
+            return value
+
+    try:
+        # The value may have landed between our miss and taking the lock
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, timeout)
+            if stale_key is not None:
+                cache.set(stale_key, value, stale_timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def _wait_for_value_or_lock(key, lock_key):
+    """
+    Poll until the lock holder stores the value (returned), or the lock is
+    released or expires and we hold it instead (None). The lock expires
+    within SINGLE_FLIGHT_LOCK_SECONDS, so waiting longer means other
+    workers keep winning it without ever storing a value.
+    """
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.add(lock_key, 1, settings.SINGLE_FLIGHT_LOCK_SECONDS):
+            return None
+    raise TimeoutError(f'{key} was not recomputed within {settings.SINGLE_FLIGHT_LOCK_SECONDS}s')
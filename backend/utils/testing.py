@@ -0,0 +1,12 @@
+from rest_framework.test import APIClient
+
+from userApp.tokens import RoleRefreshToken
+
+
+def api_client(user):
+    """Client authenticated the way the frontend is: bearer token plus the jwt_access_token cookie"""
+    token = str(RoleRefreshToken.for_user(user).access_token_for(user))
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    client.cookies['jwt_access_token'] = token
+    return client
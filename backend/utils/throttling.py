@@ -0,0 +1,133 @@
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+RATE_RE = re.compile(r'^(\d+)/(\d*)([smhd])')
+PERIOD_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'10/m', '3/15m', '100/hour' -> (requests, seconds)"""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f'Invalid throttle rate: {rate!r}')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIOD_SECONDS[unit]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Sliding-window counter throttle keyed per client IP and, when the view
+    names one, per account (the email or username in the request body).
+
+    Each key keeps two integer counters in the cache, the current and the
+    previous fixed window; the previous one is weighted by how much of it
+    still overlaps the sliding window. A request is counted first, with one
+    atomic incr per key, and the value incr returns is what gets checked,
+    so a concurrent burst can't all pass on the same count; a refused
+    request is taken back off. With one get_many for the previous windows
+    that is the whole cost whatever the rate, and all of it runs before
+    the view touches the database or the mail server.
+
+    Rates come from settings.AUTH_THROTTLE_RATES[scope], e.g.
+    {'ip': '10/h', 'account': '3/15m'}; a missing entry disables that key.
+    """
+    scope = None
+    account_field = None
+    timer = time.time
+
+    def get_rates(self):
+        return settings.AUTH_THROTTLE_RATES.get(self.scope, {})
+
+    def get_idents(self, request):
+        idents = {'ip': self.get_ident(request)}
+        if self.account_field:
+            value = request.data.get(self.account_field)
+            if isinstance(value, str) and value.strip():
+                # Hashed so addresses don't end up in cache keys
+                idents['account'] = hashlib.sha1(value.strip().lower().encode()).hexdigest()
+        return idents
+
+    def allow_request(self, request, view):
+        rates = self.get_rates()
+        idents = self.get_idents(request)
+        now = self.timer()
+
+        limits = []  # (current window key, previous window key, requests, seconds)
+        for kind, ident in idents.items():
+            if kind not in rates or ident is None:
+                continue
+            num_requests, duration = parse_rate(rates[kind])
+            window = int(now // duration)
+            prefix = f'throttle:{self.scope}:{kind}:{ident}'
+            limits.append((f'{prefix}:{window}', f'{prefix}:{window - 1}', num_requests, duration))
+        if not limits:
+            return True
+
+        earlier_counts = cache.get_many([previous for _, previous, _, _ in limits])
+        self.wait_seconds = 0
+        counted = []
+        for current, previous, num_requests, duration in limits:
+            hits = self.count(current, duration)  # including this request
+            counted.append(current)
+            elapsed = now % duration
+            earlier = earlier_counts.get(previous, 0)
+            if earlier * (1 - elapsed / duration) + hits > num_requests:
+                self.wait_seconds = max(self.wait_seconds, self.retry_after(hits - 1, earlier, num_requests, duration, elapsed))
+        if not self.wait_seconds:
+            return True
+
+        for current in counted:
+            try:
+                cache.decr(current)
+            except ValueError:
+                pass
+        return False
+
+    @staticmethod
+    def count(key, duration):
+        """Add one to a window's counter and return its new value"""
+        # Counters outlive their window by one so the next window can weigh them
+        if cache.add(key, 1, duration * 2):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Expired between the add and the incr
+            cache.set(key, 1, duration * 2)
+            return 1
+
+    @staticmethod
+    def retry_after(hits, earlier, num_requests, duration, elapsed):
+        """Seconds until the weighted count leaves room for one more request"""
+        if hits < num_requests and earlier:
+            # The previous window's weight decays enough later in this window
+            return max(1, duration * (1 - (num_requests - 1 - hits) / earlier) - elapsed)
+        # This window is full: wait for it to become the previous one and decay
+        return max(1, duration - elapsed + duration * max(0, 1 - (num_requests - 1) / max(hits, 1)))
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None) or None
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    account_field = 'username'
+
+
+class RegisterThrottle(SlidingWindowThrottle):
+    scope = 'register'
+
+
+class ResetCodeSendThrottle(SlidingWindowThrottle):
+    scope = 'reset_code_send'
+    account_field = 'email'
+
+
+class ResetCodeVerifyThrottle(SlidingWindowThrottle):
+    scope = 'reset_code_verify'
+    account_field = 'email'
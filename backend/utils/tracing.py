@@ -0,0 +1,276 @@
+import atexit
+import contextvars
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack, contextmanager
+
+import orjson
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# Longest SQL statement kept on a db.query span
+MAX_STATEMENT_LENGTH = 1000
+
+
+class Span:
+    """One timed operation; the field names follow OpenTelemetry's OTLP/JSON span"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class NoopSpan:
+    """Stands in for a span when the trace is not sampled; costs nothing"""
+
+    def set_attribute(self, key, value):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+@contextmanager
+def _record(span):
+    token = current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        current_span.reset(token)
+        span.end_ns = time.time_ns()
+        get_processor().submit(span)
+
+
+@contextmanager
+def start_trace(name, traceparent=None, **attributes):
+    """
+    Root span of a trace (one per request). A W3C traceparent header from an
+    upstream caller is continued, but TRACING_SAMPLE_RATE of traces are
+    kept either way: any client can send one, so its sampled flag is only
+    followed with TRACING_TRUST_TRACEPARENT (a proxy in front that sets the
+    header). Unsampled traces yield NOOP_SPAN and every span() inside them
+    is a no-op.
+    """
+    match = TRACEPARENT_RE.match(traceparent or '')
+    if match and settings.TRACING_TRUST_TRACEPARENT:
+        sampled = int(match.group(3), 16) & 1
+    else:
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+    if not sampled:
+        yield NOOP_SPAN
+        return
+    if match:
+        trace_id, parent_id, _ = match.groups()
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+    with _record(Span(name, trace_id, parent_id, attributes)) as root:
+        yield root
+
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the current one; a no-op outside a sampled trace"""
+    parent = current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with _record(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child
+
+
+def trace_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper giving every SQL query a db.query span"""
+    with span('db.query', **{
+        'db.system': context['connection'].vendor,
+        'db.name': context['connection'].alias,
+        'db.statement': sql[:MAX_STATEMENT_LENGTH],
+    }):
+        return execute(sql, params, many, context)
+
+
+class TracingMiddleware:
+    """Start a trace per request; sampled requests also get a span per SQL query"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with start_trace(
+            f'{request.method} {request.path}',
+            request.headers.get('traceparent'),
+            **{'http.method': request.method, 'http.target': request.path},
+        ) as root:
+            if root is NOOP_SPAN:
+                return self.get_response(request)
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(trace_queries))
+                response = self.get_response(request)
+            if request.resolver_match is not None:
+                root.name = f'{request.method} /{request.resolver_match.route}'
+            root.set_attribute('http.status_code', response.status_code)
+            return response
+
+
+class FileSpanExporter:
+    """Append spans as OTLP/JSON lines to TRACING_FILE (a local collector stand-in)"""
+
+    def __init__(self):
+        self.path = settings.TRACING_FILE
+
+    def export(self, spans):
+        with open(self.path, 'ab') as f:
+            f.write(b''.join(orjson.dumps(span.to_otlp()) + b'\n' for span in spans))
+
+
+class OTLPHttpSpanExporter:
+    """POST batches to an OTLP/HTTP JSON collector (e.g. the OpenTelemetry Collector's :4318/v1/traces)"""
+
+    def __init__(self):
+        self.endpoint = settings.TRACING_OTLP_ENDPOINT
+
+    def export(self, spans):
+        body = orjson.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': otlp_value(settings.TRACING_SERVICE_NAME)}]},
+            'scopeSpans': [{'scope': {'name': 'utils.tracing'}, 'spans': [span.to_otlp() for span in spans]}],
+        }]})
+        request = urllib.request.Request(self.endpoint, data=body, headers={'Content-Type': 'application/json'})
+        urllib.request.urlopen(request, timeout=5).close()
+
+
+class BatchSpanProcessor:
+    """
+    Ends of spans go on a bounded queue; a daemon thread exports them in
+    batches, so request threads never wait on the file or the collector.
+    Spans are dropped when the queue is full or the exporter fails; the
+    count (and the last export error) is logged at most once every
+    drop_report_seconds.
+    """
+    BATCH_SIZE = 512
+
+    def __init__(self, exporter, queue_size=20000, interval=2.0, drop_report_seconds=60):
+        self.exporter = exporter
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.export_error = None
+        self.drop_report_seconds = drop_report_seconds
+        self._last_drop_report = float('-inf')
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=timeout))
+            while len(batch) < self.BATCH_SIZE:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _export(self, batch):
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            self.export_error = f'{type(e).__name__}: {e}'
+        if self.dropped and time.monotonic() - self._last_drop_report >= self.drop_report_seconds:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        error, self.export_error = self.export_error, None
+        self._last_drop_report = time.monotonic()
+        logger.warning(
+            'Dropped %d spans: %s', dropped, f'export failed ({error})' if error else 'the span queue was full',
+            extra={'dropped_spans': dropped, 'export_error': error},
+        )
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(self.interval)
+            if batch:
+                self._export(batch)
+            elif self.dropped and time.monotonic() - self._last_drop_report >= self.drop_report_seconds:
+                self._report_dropped()
+
+    def flush(self):
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                return
+            self._export(batch)
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_processor():
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                _processor = BatchSpanProcessor(
+                    import_string(settings.TRACING_EXPORTER)(),
+                    drop_report_seconds=settings.TRACING_DROP_REPORT_SECONDS,
+                )
+    return _processor
@@ -102,6 +102,9 @@ export function CartButton({ onAddToCart }: CartButtonProps) {
   const [buttonPosition, setButtonPosition] = useState(0);
   const [isHovered, setIsHovered] = useState(false);
   const animationFrame = useRef<number | null>(null);
+  // One key per checkout attempt, reused when the request is retried so the
+  // backend places the order only once
+  const checkoutKey = useRef<string | null>(null);
   const { height: viewportHeight } = useViewportSize();
 
   // Animation states
@@ -521,12 +524,18 @@ export function CartButton({ onAddToCart }: CartButtonProps) {
       formData.append("proof_of_payment", proofOfPayment);
     }
 
+    if (!checkoutKey.current) {
+      checkoutKey.current = crypto.randomUUID();
+    }
+
     try {
       await axios.post("orders/", formData, {
         headers: {
           "Content-Type": "multipart/form-data",
+          "Idempotency-Key": checkoutKey.current,
         },
       });
+      checkoutKey.current = null;
       await mutate();
 
       notifications.show({
@@ -549,6 +558,12 @@ export function CartButton({ onAddToCart }: CartButtonProps) {
       }, 500);
     } catch (error: any) {
       setProcessingOrder(false);
+      // Keep the key only when the outcome is unknown (no response, server
+      // error, still processing); anything else was a definite answer
+      const status = error.response?.status;
+      if (status && status < 500 && status !== 409) {
+        checkoutKey.current = null;
+      }
       notifications.show({
         title: "Error",
         message: error.response?.data?.message || "Failed to place order",
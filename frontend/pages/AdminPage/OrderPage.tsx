@@ -175,6 +175,21 @@ const isDateFromToday = (dateString: string | undefined): boolean => {
          orderDate.getFullYear() === currentDate.getFullYear();
 };
 
+// Statuses an order may be given from its current one; mirrors
+// ORDER_TRANSITIONS in backend/ordersApp/transitions.py
+const ORDER_TRANSITIONS: Record<string, string[]> = {
+  Pending: ["Pending", "Completed", "Cancelled"],
+  Completed: [],
+  Cancelled: [],
+};
+
+const canMoveTo = (current: string, next: string) => (ORDER_TRANSITIONS[current] || []).includes(next);
+
+// The current status (saving it unchanged is always allowed) followed by the ones it may move to
+const statusOptions = (current: string) =>
+  [current, ...(ORDER_TRANSITIONS[current] || []).filter((status) => status !== current)]
+    .map((status) => ({ value: status, label: status }));
+
 const OrderStatusBadge = ({ status }: { status: string }) => {
   return (
     <Badge
@@ -364,6 +379,11 @@ const OrderPage = () => {
     setEditModalOpened(true);
   };
 
+  // Status of the order being edited as last loaded, before any change in the edit modal
+  const savedStatus = selectedOrder
+    ? orders.find((order) => order.id === selectedOrder.id)?.status ?? selectedOrder.status
+    : "";
+
   const handleStatusUpdate = async (orderId: number, newStatus: string) => {
     try {
       setLoading(true);
@@ -381,10 +401,10 @@ const OrderPage = () => {
         color: "green",
       });
       mutate();
-    } catch (error) {
+    } catch (error: any) {
       notifications.show({
         title: "Error",
-        message: "Failed to update order status",
+        message: error.response?.data?.error || "Failed to update order status",
         color: "red",
       });
     } finally {
@@ -431,7 +451,7 @@ const OrderPage = () => {
       
       notifications.show({
         title: "Error",
-        message: error.response?.data?.detail || "Failed to update order status",
+        message: error.response?.data?.error || error.response?.data?.detail || "Failed to update order status",
         color: "red",
       });
     } finally {
@@ -1434,7 +1454,7 @@ const OrderPage = () => {
                     Close
                   </Button>
                   <Group>
-                    {selectedOrder.status !== "Completed" && (
+                    {canMoveTo(selectedOrder.status, "Completed") && (
                       <Button 
                         variant="outline" 
                         color="green"
@@ -1517,12 +1537,13 @@ const OrderPage = () => {
                       name="status"
                       value={selectedOrder.status}
                       onChange={(value) => handleSelectChange(value, "status")}
-                      data={[
-                        { value: "Pending", label: "Pending" },
-                        { value: "Completed", label: "Completed" },
-                        { value: "Cancelled", label: "Cancelled" },
-                      ]}
-                      description="Change the current status of this order"
+                      data={statusOptions(savedStatus)}
+                      disabled={(ORDER_TRANSITIONS[savedStatus] || []).length === 0}
+                      description={
+                        (ORDER_TRANSITIONS[savedStatus] || []).length === 0
+                          ? `${savedStatus} orders can no longer change status`
+                          : "Change the current status of this order"
+                      }
                     />
                   </Stack>
                 </Paper>